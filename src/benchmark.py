@@ -0,0 +1,221 @@
+import argparse
+import json
+import multiprocessing as mp
+import platform
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+import pysat
+from knight_tour import build_knight_tour, extract_solution, extract_all_solutions
+from budget import Budget
+from profiling import Profile
+from verify import verify_tours
+
+# The fixed boards of each set, as (M, N, i0, j0, task, expected): the
+# number of tours for 'count', whether there is one for 'solve'.
+BOARD_SETS = {
+    'small': [(3, 4, 0, 0, 'count', 2), (4, 5, 0, 0, 'count', 32),
+              (5, 5, 0, 0, 'count', 304)],
+    'mid': [(6, 6, 0, 0, 'solve', True), (5, 8, 0, 0, 'solve', True),
+            (7, 7, 0, 0, 'solve', True), (8, 8, 0, 0, 'solve', True)],
+    'unsat': [(3, 3, 0, 0, 'solve', False), (4, 4, 0, 0, 'solve', False),
+              (3, 5, 0, 0, 'solve', False), (3, 6, 0, 0, 'solve', False),
+              (5, 5, 0, 1, 'solve', False), (7, 7, 0, 1, 'solve', False)],
+    'large': [(12, 12, 0, 0, 'solve', True), (16, 16, 0, 0, 'solve', True)],
+}
+
+MODES = ('n', 'sc', 'succ', 'log')
+
+# The modes run by default: 'log' trades search time for a smaller formula,
+# and times out on the mid and large boards.
+DEFAULT_MODES = ('n', 'sc', 'succ')
+
+# Modes whose formula outgrows these boards, by number of cells: the naive
+# clauses grow as (M * N)^3.
+MAX_CELLS = {'n': 100}
+
+def case_key(case) -> str:
+    """What identifies a case across runs, e.g. 'mid/8x8@(0,0)/sc'."""
+
+    return f"{case['set']}/{case['M']}x{case['N']}@({case['i0']},{case['j0']})/{case['mode']}"
+
+def benchmark_cases(sets=tuple(BOARD_SETS), modes=DEFAULT_MODES, repeats=3,
+                    timeout=30.0) -> list[dict]:
+    """Lists the runs of a benchmark, repeats per board of the sets and mode.
+
+    @param timeout: The time limit of each run in seconds, the run being
+        recorded with a None result past it.
+    """
+
+    cases = []
+    for name in sets:
+        for M, N, i0, j0, task, expected in BOARD_SETS[name]:
+            for mode in modes:
+                if M * N > MAX_CELLS.get(mode, M * N):
+                    continue
+                for repeat in range(repeats):
+                    cases.append({'set': name, 'M': M, 'N': N, 'i0': i0, 'j0': j0,
+                                  'mode': mode, 'task': task, 'expected': expected,
+                                  'repeat': repeat, 'timeout': timeout})
+    return cases
+
+def run_case(case) -> dict:
+    """Builds and solves one case, profiled (see Profile).
+
+    @return: the profile record, with the case and whether the result is
+        the expected one, the tours found being checked (see verify_tours).
+    """
+
+    profile = Profile(**case)
+    budget = Budget(timeout=case['timeout']) if case['timeout'] else None
+    M, N, i0, j0 = case['M'], case['N'], case['i0'], case['j0']
+    solver, vars = build_knight_tour(M, N, i0, j0, case['mode'], profile=profile)
+    if case['task'] == 'count':
+        tours, _ = extract_all_solutions(solver, M, N, vars, budget=budget, profile=profile)
+        answer = profile.record['solutions']
+    else:
+        tour, answer = extract_solution(solver, M, N, vars, budget=budget, profile=profile)
+        tours = [tour] if answer else []
+    solver.delete()
+
+    record = profile.record
+    record['time'] = sum(record['phases'].values())
+    valid = len(tours) == 0 or bool(verify_tours(tours, M, N, i0, j0).all())
+    record['correct'] = None if record['result'] is None else \
+        valid and answer == case['expected']
+    return record
+
+def run_benchmark(cases, output=None) -> list[dict]:
+    """Runs the cases one after the other, each one in a fresh process so
+    that the peak memory and the solver state are its own.
+
+    @param output: A JSON lines file to append the records to, if any.
+    """
+
+    records = []
+    with mp.get_context().Pool(1, maxtasksperchild=1) as pool:
+        for record in pool.imap(run_case, cases):
+            records.append(record)
+            if output is not None:
+                with open(output, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+            print(f"{case_key(record)} #{record['repeat']}: {record['time']:.3f}s, "
+                  f"{'timeout' if record['result'] is None else record['result']}",
+                  file=sys.stderr)
+    return records
+
+def summarize(records) -> dict:
+    """Sums up the records per case over the repeats, with medians.
+
+    @return: a dict case key -> {'time', 'phases', 'conflicts': medians,
+        'times': all the times, 'clauses', 'variables': totals,
+        'peak_memory_kb': the largest, 'timeouts', 'wrong': counts}.
+    """
+
+    cases = {}
+    for record in records:
+        cases.setdefault(case_key(record), []).append(record)
+
+    summary = {}
+    for key, runs in cases.items():
+        phases = {phase for run in runs for phase in run['phases']}
+        memory = [run['peak_memory_kb'] for run in runs if run['peak_memory_kb'] is not None]
+        summary[key] = {
+            'time': statistics.median(run['time'] for run in runs),
+            'times': [run['time'] for run in runs],
+            'phases': {phase: statistics.median(run['phases'].get(phase, 0.0) for run in runs)
+                       for phase in sorted(phases)},
+            'conflicts': statistics.median(run['stats'].get('conflicts', 0) for run in runs),
+            'clauses': sum(runs[0]['clauses'].values()),
+            'variables': sum(runs[0]['variables'].values()),
+            'peak_memory_kb': max(memory) if memory else None,
+            'timeouts': sum(run['result'] is None for run in runs),
+            'wrong': sum(run['correct'] is False for run in runs),
+        }
+    return summary
+
+def environment() -> dict:
+    """What the results depend on apart from the cases."""
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                                text=True, cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        commit = None
+    return {'commit': commit or None, 'python': platform.python_version(),
+            'pysat': pysat.__version__, 'machine': platform.machine(),
+            'system': platform.system()}
+
+def compare(baseline, current, threshold=1.25, min_time=0.05) -> list[str]:
+    """Lists the regressions of the current summary against the baseline.
+
+    A case regresses when its median time grows by more than threshold
+    times and min_time seconds, when it times out or gives a wrong result
+    more often, or when its formula gets bigger.
+    """
+
+    regressions = []
+    for key, now in sorted(current.items()):
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if now['time'] > before['time'] * threshold and now['time'] - before['time'] > min_time:
+            regressions.append(f"{key}: {before['time']:.3f}s -> {now['time']:.3f}s "
+                               f"({now['time'] / max(before['time'], 1e-9):.2f}x)")
+        for count in ('timeouts', 'wrong', 'clauses', 'variables'):
+            if now[count] > before[count]:
+                regressions.append(f"{key}: {count} {before[count]} -> {now[count]}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Knight's Tour encoding benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="run the benchmark and save its results")
+    run.add_argument('output', help="the results directory")
+    run.add_argument('--sets', nargs='+', default=list(BOARD_SETS), choices=list(BOARD_SETS))
+    run.add_argument('--modes', nargs='+', default=list(DEFAULT_MODES), choices=list(MODES))
+    run.add_argument('--repeats', type=int, default=3)
+    run.add_argument('--timeout', type=float, default=30.0,
+                     help="the time limit of each run in seconds, 0 for none")
+
+    cmp = commands.add_parser('compare', help="flag the regressions against a baseline")
+    cmp.add_argument('baseline', help="a summary.json, or the directory holding it")
+    cmp.add_argument('current', help="the same for the results to check")
+    cmp.add_argument('--threshold', type=float, default=1.25,
+                     help="the slowdown ratio flagged as a regression")
+    cmp.add_argument('--min-time', type=float, default=0.05,
+                     help="the slowdown in seconds below which nothing is flagged")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        output = Path(args.output)
+        output.mkdir(parents=True, exist_ok=True)
+        records_path = output / 'records.jsonl'
+        records_path.unlink(missing_ok=True)
+        cases = benchmark_cases(args.sets, args.modes, args.repeats, args.timeout or None)
+        summary = summarize(run_benchmark(cases, records_path))
+        with open(output / 'summary.json', 'w') as f:
+            json.dump({'environment': environment(), 'cases': summary}, f, indent=2)
+        for key, entry in summary.items():
+            print(f"{key}: {entry['time']:.3f}s, {entry['clauses']} clauses, "
+                  f"{entry['timeouts']} timeouts, {entry['wrong']} wrong")
+        return 1 if any(entry['wrong'] for entry in summary.values()) else 0
+
+    def load(path):
+        path = Path(path)
+        with open(path / 'summary.json' if path.is_dir() else path) as f:
+            return json.load(f)['cases']
+
+    regressions = compare(load(args.baseline), load(args.current),
+                          args.threshold, args.min_time)
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    if not regressions:
+        print("No regression")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import asyncio
+import threading
+from time import monotonic
+from knight_tour import build_knight_tour, extract_solution, extract_all_solutions
+
+def supports_interrupt(solver) -> bool:
+    """Tells whether the backend of a solver can be interrupted."""
+
+    try:
+        solver.clear_interrupt()
+    except NotImplementedError:
+        return False
+    return True
+
+class Budget:
+    """Limits on the search of the solve calls it is given, e.g. all the
+    calls of an extraction or an enumeration: a number of conflicts, of
+    propagations, and a wall-clock timeout in seconds, None meaning no
+    limit. The timeout starts with the first call.
+
+    A call that runs out of budget returns None, pysat's "unknown", and
+    the budget is then exhausted: the next calls return None at once.
+
+    The timeout interrupts the solver from a timer thread. Some backends,
+    such as CaDiCaL, cannot be interrupted, or keep the GIL while solving:
+    the search is also cut into slices of slice_conflicts conflicts, and
+    the clock is checked between two slices. The backend must support
+    solve_limited, which rules out e.g. 'lingeling'.
+    """
+
+    def __init__(self, conflicts=None, propagations=None, timeout=None,
+                 slice_conflicts=1000):
+        self.conflicts = conflicts
+        self.propagations = propagations
+        self.timeout = timeout
+        self.slice_conflicts = slice_conflicts
+        self.used = {'conflicts': 0, 'propagations': 0}
+        self.deadline = None
+        self.exhausted = False
+        self.cancelled = False
+        self.solver = None  # the solver being run, to be interrupted
+        self.lock = threading.Lock()
+
+    def remaining_time(self) -> float | None:
+        if self.timeout is None:
+            return None
+        if self.deadline is None:
+            self.deadline = monotonic() + self.timeout
+        return self.deadline - monotonic()
+
+    def left(self, key) -> int | None:
+        """The conflicts or propagations left, None if unlimited."""
+
+        limit = getattr(self, key)
+        return None if limit is None else limit - self.used[key]
+
+    def solve(self, solver, assumptions=[]) -> bool | None:
+        """Solves under assumptions within what is left of the budget.
+
+        @return: whether the formula is satisfiable, or None if the budget
+            ran out, or was cancelled, before the solver could tell.
+        """
+
+        while not (self.exhausted or self.cancelled):
+            remaining = self.remaining_time()
+            conflicts = self.left('conflicts')
+            propagations = self.left('propagations')
+            if (remaining is not None and remaining <= 0) or \
+                    (conflicts is not None and conflicts <= 0) or \
+                    (propagations is not None and propagations <= 0):
+                break
+
+            step = conflicts
+            if remaining is not None:
+                step = self.slice_conflicts if step is None else min(step, self.slice_conflicts)
+            if step is not None:
+                solver.conf_budget(step)
+            if propagations is not None:
+                solver.prop_budget(propagations)
+            res = self.run(solver, assumptions, remaining)
+            if res is not None:
+                return res
+
+        self.exhausted = True
+        return None
+
+    def run(self, solver, assumptions, remaining) -> bool | None:
+        """One solve_limited call, interrupted after remaining seconds,
+        accounting for what it used."""
+
+        before = self.stats(solver)
+        interruptible = supports_interrupt(solver)
+        timer = None
+        if remaining is not None and interruptible:
+            timer = threading.Timer(remaining, self.interrupt)
+            timer.start()
+        if interruptible:
+            with self.lock:
+                self.solver = solver
+                if self.cancelled:
+                    solver.interrupt()
+        try:
+            res = solver.solve_limited(assumptions=assumptions,
+                                       expect_interrupt=interruptible)
+        finally:
+            if timer is not None:
+                timer.cancel()
+                timer.join()
+            if interruptible:
+                with self.lock:
+                    self.solver = None
+                solver.clear_interrupt()
+
+        # Every call is charged, whether it finished or ran out
+        after = self.stats(solver)
+        for key in self.used:
+            self.used[key] += after.get(key, 0) - before.get(key, 0)
+        return res
+
+    def stats(self, solver) -> dict:
+        """The statistics of the solver so far, which the budget charges
+        the calls from."""
+
+        if self.conflicts is None and self.propagations is None:
+            return {}
+        return solver.accum_stats() or {}
+
+    def interrupt(self):
+        with self.lock:
+            if self.solver is not None:
+                self.solver.interrupt()
+
+    def cancel(self):
+        """Stops the solve call running with this budget, from any thread,
+        and makes the next ones return None."""
+
+        self.cancelled = True
+        self.interrupt()
+
+async def solve_async(M, N, i0, j0, mode='sc', task='solve', budget=None,
+                      executor=None, **options):
+    """Builds and solves a Knight's Tour problem in an executor, so that an
+    event loop can serve many solve requests at once.
+
+    Cancelling the awaiting task cancels the budget, which interrupts the
+    solver: the executor thread is given back as soon as the solver
+    stops, within a slice of the budget on the backends keeping the GIL.
+
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param i0: The start row.
+    @param j0: The start column.
+    @param mode: 'n', 'sc', 'succ' or 'log', see build_knight_tour.
+    @param task: 'solve' to look for one tour, 'all' to enumerate them.
+    @param budget: The Budget of the search, by default unlimited.
+    @param executor: The concurrent.futures executor to run in, by default
+        the one of the event loop. It should be a thread pool: the budget
+        is cancelled from the event loop thread.
+    @param options: Other options of build_knight_tour.
+    @return: as extract_solution for 'solve' and extract_all_solutions for
+        'all', the result being None if the budget ran out. The tours found
+        so far are then returned by 'all'.
+    """
+
+    if task not in ('solve', 'all'):
+        raise ValueError(f"Unknown task {task!r}, expected 'solve' or 'all'")
+    budget = budget or Budget()
+
+    def run():
+        solver, vars = build_knight_tour(M, N, i0, j0, mode, **options)
+        try:
+            if task == 'all':
+                return extract_all_solutions(solver, M, N, vars, budget=budget)
+            return extract_solution(solver, M, N, vars, budget=budget)
+        finally:
+            solver.delete()
+
+    future = asyncio.get_running_loop().run_in_executor(executor, run)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        budget.cancel()
+        # The solver is freed by the executor thread
+        await asyncio.wait([future])
+        raise
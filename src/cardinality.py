@@ -0,0 +1,165 @@
+from itertools import combinations
+from math import ceil, isqrt
+import numpy as np
+from pysat.card import CardEnc, EncType
+
+# Every encoder adds an exactly-one constraint over lits, creating its
+# auxiliary variables from var_id on, and returns the next free variable id.
+
+def exactly_one_pairwise(solver, lits: np.ndarray, var_id: int) -> int:
+    """Adds an exactly-one constraint over lits: one clause for at least one,
+    and a quadratic number of clauses excluding each pair of them.
+    """
+
+    solver.add_clause(lits.tolist())
+    # not(A and B) <=> (not A or not b)
+    first, second = np.triu_indices(len(lits), 1)
+    solver.append_formula(
+        (-np.stack([lits[first], lits[second]], axis=1)).tolist())
+    return var_id
+
+def exactly_one_sequential_counter(solver, lits: np.ndarray, var_id: int) -> int:
+    """Adds an exactly-one constraint over lits with the sequential counter
+    encoding: aux a_l is true when one of X_0..X_l is.
+    """
+
+    n = len(lits)
+
+    # Add clause: at least one literal is true
+    solver.add_clause(lits.tolist())
+
+    # Case 2: Exactly one: (X_0 v X_1) ^ (!X_0 v !X_1)
+    if n == 2:
+        solver.add_clause([-int(lits[0]), -int(lits[1])])  # At most one
+        return var_id
+
+    aux = np.arange(var_id, var_id + n - 1)
+    x, a, prev_a = lits[1:-1], aux[1:], aux[:-1]
+    clauses = np.concatenate([
+        [[-lits[0], aux[0]]],                       # First: !X_0 v a_0
+        np.stack([-x, a], axis=1),                  # !X_i v a_i
+        np.stack([-prev_a, a], axis=1),             # !a_{i-1} v a_i
+        np.stack([-x, -prev_a], axis=1),            # !X_i v !a_{i-1}
+        [[-lits[-1], -aux[-1]]],                    # Last: !X_{n-1} v !a_{n-2}
+    ])
+    solver.append_formula(clauses.tolist())
+
+    return var_id + n - 1
+
+def exactly_one_commander(solver, lits: np.ndarray, var_id: int,
+                          group_size: int = 3) -> int:
+    """Adds an exactly-one constraint over lits with the commander encoding
+    (Klieber and Kwon): the literals are split into groups of group_size,
+    each with a commander variable true iff one of its group is. At most one
+    literal per group is excluded pairwise, and exactly one commander is
+    then required, recursively.
+    """
+
+    lits = [int(lit) for lit in lits]
+    if len(lits) <= group_size + 1:
+        return exactly_one_pairwise(solver, np.array(lits), var_id)
+
+    commanders = []
+    clauses = []
+    for k in range(0, len(lits), group_size):
+        group = lits[k:k + group_size]
+        c = var_id
+        var_id += 1
+        commanders.append(c)
+        clauses += [[-a, -b] for a, b in combinations(group, 2)]
+        clauses.append([-c] + group)                # c -> one of the group
+        clauses += [[-x, c] for x in group]         # one of the group -> c
+    solver.append_formula(clauses)
+
+    return exactly_one_commander(solver, np.array(commanders), var_id, group_size)
+
+def at_most_one_product(solver, lits: np.ndarray, var_id: int) -> int:
+    """Adds an at-most-one constraint over lits with the 2-product encoding
+    (Chen): the literals are laid out on a p x q grid, each one implying
+    its row and column variables, and at most one row and one column
+    variable can be true, recursively.
+    """
+
+    n = len(lits)
+    if n <= 4:
+        first, second = np.triu_indices(n, 1)
+        solver.append_formula(
+            (-np.stack([lits[first], lits[second]], axis=1)).tolist())
+        return var_id
+
+    p = isqrt(n - 1) + 1
+    q = ceil(n / p)
+    rows = np.arange(var_id, var_id + p)
+    cols = np.arange(var_id + p, var_id + p + q)
+    var_id += p + q
+
+    r, c = np.divmod(np.arange(n), q)
+    solver.append_formula(np.concatenate([
+        np.stack([-lits, rows[r]], axis=1),         # !X_k v u_r
+        np.stack([-lits, cols[c]], axis=1),         # !X_k v v_c
+    ]).tolist())
+
+    var_id = at_most_one_product(solver, rows, var_id)
+    return at_most_one_product(solver, cols, var_id)
+
+def exactly_one_product(solver, lits: np.ndarray, var_id: int) -> int:
+    """Adds an exactly-one constraint over lits with the product encoding,
+    see at_most_one_product."""
+
+    solver.add_clause(lits.tolist())
+    return at_most_one_product(solver, lits, var_id)
+
+def exactly_one_cardenc(solver, lits: np.ndarray, var_id: int,
+                        encoding: int = EncType.totalizer) -> int:
+    """Adds an exactly-one constraint over lits with one of the encodings
+    of pysat.card.CardEnc, given as an EncType."""
+
+    cnf = CardEnc.equals(lits=lits.tolist(), bound=1, top_id=var_id - 1,
+                         encoding=encoding)
+    solver.append_formula(cnf.clauses)
+    return max(var_id, cnf.nv + 1)
+
+def cardenc(encoding: int):
+    """The encoder using the given CardEnc encoding."""
+
+    return lambda solver, lits, var_id: exactly_one_cardenc(
+        solver, lits, var_id, encoding)
+
+# Encoding name -> encoder
+CARD_ENCODINGS = {
+    'pairwise': exactly_one_pairwise,
+    'seqcounter': exactly_one_sequential_counter,
+    'commander': exactly_one_commander,
+    'product': exactly_one_product,
+    'totalizer': cardenc(EncType.totalizer),
+    'mtotalizer': cardenc(EncType.mtotalizer),
+    'kmtotalizer': cardenc(EncType.kmtotalizer),
+    'ladder': cardenc(EncType.ladder),
+    'bitwise': cardenc(EncType.bitwise),
+    'sortnetwrk': cardenc(EncType.sortnetwrk),
+    'cardnetwrk': cardenc(EncType.cardnetwrk),
+}
+
+def add_exactly_one(solver, lits: np.ndarray, var_id: int,
+                    encoding: str = 'pairwise') -> int:
+    """Adds an exactly-one constraint over lits with the named encoding
+    (see CARD_ENCODINGS).
+
+    @return: the next free variable id.
+    """
+
+    if encoding not in CARD_ENCODINGS:
+        raise ValueError(f"Unknown cardinality encoding {encoding!r}, "
+                         f"expected one of {sorted(CARD_ENCODINGS)}")
+
+    # Case 0: no literal can be true, no solution
+    if len(lits) == 0:
+        solver.add_clause([])
+        return var_id
+
+    # Case 1: the single literal must be true
+    if len(lits) == 1:
+        solver.add_clause([int(lits[0])])
+        return var_id
+
+    return CARD_ENCODINGS[encoding](solver, np.asarray(lits, dtype=np.int64), var_id)
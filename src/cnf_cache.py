@@ -0,0 +1,194 @@
+import gc
+import hashlib
+import os
+import pickle
+from pathlib import Path
+import numpy as np
+from helpers import ClauseList
+
+# Where the formulas are kept, and how much room they may take
+CACHE_DIR = Path(os.environ.get('KNIGHT_CNF_CACHE',
+                                Path.home() / '.cache' / 'knight_tour_cnf'))
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# The modules whose code shapes the formulas: editing any of them changes
+# the encoder version, and so the keys of the cache entries.
+ENCODER_MODULES = ('knight_tour.py', 'constraints.py', 'cardinality.py',
+                   'symmetry.py', 'helpers.py')
+
+def encoder_version() -> str:
+    """A hash of the source code of the encoder."""
+
+    digest = hashlib.sha256()
+    here = Path(__file__).parent
+    for name in ENCODER_MODULES:
+        digest.update((here / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+def cache_key(*params) -> str:
+    """The name of the cache entry of the formula built with params, for
+    the current encoder version."""
+
+    return hashlib.sha256(repr((encoder_version(), params)).encode()).hexdigest()[:32]
+
+def entry_paths(key, cache_dir=None) -> tuple[Path, Path, Path]:
+    """The files of an entry: the literals of all the clauses one after the
+    other, the offset of each clause in them, and the pickled variables."""
+
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    return (cache_dir / f'{key}.lits.npy', cache_dir / f'{key}.offsets.npy',
+            cache_dir / f'{key}.vars.pkl')
+
+def pack_clauses(clauses) -> tuple[np.ndarray, np.ndarray]:
+    """The literals of all the clauses one after the other, and the offset
+    of each clause in them.
+
+    The clauses are sorted by length, which does not change the formula,
+    so that they load back as a few runs of a same length (see
+    clause_runs) instead of one per change of length.
+    """
+
+    lengths = np.fromiter((len(clause) for clause in clauses), dtype=np.int64,
+                          count=len(clauses))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    lits = np.fromiter((lit for clause in clauses for lit in clause),
+                       dtype=np.int32, count=int(offsets[-1]))
+
+    order = np.argsort(lengths, kind='stable')
+    lengths = lengths[order]
+    sorted_offsets = np.concatenate([[0], np.cumsum(lengths)])
+    # The index in lits of each literal, clause after clause in their new order
+    shift = offsets[:-1][order] - sorted_offsets[:-1]
+    lits = lits[np.repeat(shift, lengths) + np.arange(sorted_offsets[-1])]
+    return lits, sorted_offsets
+
+def clause_runs(lits, offsets) -> list[np.ndarray]:
+    """Cuts packed clauses into runs of a same length, keeping their order,
+    as 2D arrays."""
+
+    lengths = np.diff(offsets)
+    if len(lengths) == 0:
+        return []
+    bounds = np.flatnonzero(np.diff(lengths)) + 1
+    groups = []
+    for first, last in zip(np.concatenate([[0], bounds]),
+                           np.concatenate([bounds, [len(lengths)]])):
+        run = lits[offsets[first]:offsets[last]]
+        groups.append(run.reshape(last - first, lengths[first]))
+    return groups
+
+def write_atomically(path, write):
+    """Writes a file through write(f) under a temporary name first, then
+    renames it, so that other processes never read it half written."""
+
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+def store_formula(key, clauses, var, cache_dir=None, max_bytes=CACHE_MAX_BYTES):
+    """Stores clauses and the variables they were built with under key,
+    then evicts the oldest other entries beyond max_bytes."""
+
+    lits_path, offsets_path, vars_path = entry_paths(key, cache_dir)
+    lits_path.parent.mkdir(parents=True, exist_ok=True)
+    lits, offsets = pack_clauses(clauses)
+
+    # The variables go last: an entry without them is incomplete
+    write_atomically(lits_path, lambda f: np.save(f, lits))
+    write_atomically(offsets_path, lambda f: np.save(f, offsets))
+    write_atomically(vars_path, lambda f: pickle.dump(var, f))
+
+    evict(cache_dir, max_bytes, keep=key)
+
+def load_formula(key, cache_dir=None):
+    """Loads the entry key, memory mapped.
+
+    @return: the clauses, as a list of 2D arrays holding runs of clauses
+        of a same length, and the variables, or None if there is no such entry.
+    """
+
+    lits_path, offsets_path, vars_path = entry_paths(key, cache_dir)
+    if not vars_path.exists():
+        return None
+
+    lits = np.load(lits_path, mmap_mode='r')
+    offsets = np.load(offsets_path, mmap_mode='r')
+    with open(vars_path, 'rb') as f:
+        var = pickle.load(f)
+    for path in (lits_path, offsets_path, vars_path):
+        os.utime(path)  # Most recently used
+
+    return clause_runs(lits, offsets), var
+
+def evict(cache_dir=None, max_bytes=CACHE_MAX_BYTES, keep=None):
+    """Removes the least recently used entries until the cache takes at most
+    max_bytes, or until only the entry keep is left."""
+
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    entries = {}
+    for path in cache_dir.glob('*.npy'):
+        entries.setdefault(path.name.split('.')[0], []).append(path)
+    for path in cache_dir.glob('*.pkl'):
+        entries.setdefault(path.name.split('.')[0], []).append(path)
+
+    def used(key):
+        return max(path.stat().st_mtime for path in entries[key])
+
+    total = sum(path.stat().st_size for paths in entries.values() for path in paths)
+    for key in sorted(entries, key=used):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        for path in entries[key]:
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+def cached_formula(encode, *params, cache_dir=None, max_bytes=CACHE_MAX_BYTES):
+    """The clauses and the variables of a formula, from the cache or else
+    encoded and cached.
+
+    @param encode: A function adding the formula to the solver-like object
+        it is given and returning the variables, e.g. a call to
+        encode_knight_tour.
+    @param params: Everything the formula depends on apart from the
+        encoder code, to key the cache entry.
+    @return: the clauses as a list of 2D arrays, to be added to a solver
+        with add_formula, and the variables.
+    """
+
+    key = cache_key(*params)
+    entry = load_formula(key, cache_dir)
+    if entry is not None:
+        return entry
+
+    formula = ClauseList()
+    var = encode(formula)
+    store_formula(key, formula.clauses, var, cache_dir, max_bytes)
+    entry = load_formula(key, cache_dir)
+    if entry is None:
+        # Evicted by another process meanwhile
+        return clause_runs(*pack_clauses(formula.clauses)), var
+    return entry
+
+def add_formula(solver, groups):
+    """Adds the clauses returned by cached_formula to a solver.
+
+    The garbage collector is paused meanwhile: the hundreds of thousands of
+    clause lists, which hold no cycles, would otherwise trigger collections
+    taking about a third of the time.
+    """
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for group in groups:
+            solver.append_formula(np.asarray(group).tolist())
+    finally:
+        if enabled:
+            gc.enable()
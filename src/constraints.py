@@ -1,5 +1,8 @@
+from itertools import combinations
+import numpy as np
 from pysat.solvers import Glucose3
 from helpers import valid_pos
+from cardinality import add_exactly_one, CARD_ENCODINGS
 
 # Knights moves offsets
 KNIGHT_MOVES = ((-2, -1), (-2, 1),
@@ -7,6 +10,59 @@ KNIGHT_MOVES = ((-2, -1), (-2, 1),
                 ( 1, -2), ( 1, 2),
                 ( 2, -1), ( 2, 1))
 
+def knight_distances(M: int, N: int, i0: int, j0: int) -> list[list[int]]:
+    """Computes the minimal number of knight moves from (i0, j0) to every
+    cell with a breadth-first search. Unreachable cells are set to -1.
+    """
+
+    dist = [[-1 for _ in range(N)] for _ in range(M)]
+    dist[i0][j0] = 0
+    frontier = [(i0, j0)]
+    while frontier:
+        next_frontier = []
+        for i, j in frontier:
+            for di, dj in KNIGHT_MOVES:
+                ni, nj = i + di, j + dj
+                if valid_pos(ni, nj, M, N) and dist[ni][nj] == -1:
+                    dist[ni][nj] = dist[i][j] + 1
+                    next_frontier.append((ni, nj))
+        frontier = next_frontier
+    return dist
+
+def colours_allow_tour(M: int, N: int, i0: int, j0: int) -> bool:
+    """Tells whether the colours of the squares allow a tour from (i0, j0).
+
+    The knight changes colour at each move, so a tour visits ceil(T / 2)
+    squares of the start colour. On a board with an odd number of squares,
+    this rules out starting on the minority colour, which the solvers can
+    only find out by a long pigeonhole refutation.
+    """
+
+    T = M * N
+    same_colour = (T + 1) // 2 if (i0 + j0) % 2 == 0 else T // 2
+    return same_colour == (T + 1) // 2
+
+def neighbour_ids(ids: np.ndarray, di: int, dj: int) -> np.ndarray:
+    """Shifts a (T, M, N) array of variable ids by a knight move.
+
+    @return: an array whose [t, i, j] entry is ids[t, i + di, j + dj],
+        or 0 when (i + di, j + dj) is outside the chessboard.
+    """
+
+    _, M, N = ids.shape
+    padded = np.pad(ids, ((0, 0), (2, 2), (2, 2)))
+    return padded[:, 2 + di:2 + di + M, 2 + dj:2 + dj + N]
+
+def add_implication_clauses(solver, lits: np.ndarray, options: np.ndarray):
+    """Adds the clauses lits[k] => (options[k, 0] or options[k, 1] ...)
+    in bulk, ignoring the 0 entries of options.
+    """
+
+    if len(lits) == 0:
+        return
+    clauses = np.concatenate([-lits.reshape(-1, 1), options], axis=1).tolist()
+    solver.append_formula([[l for l in clause if l] for clause in clauses])
+
 def add_legal_moves_constraints(solver: Glucose3, M: int, N: int, var: dict):
     """This function adds constraints to the SAT solver that enforce
     the possible moves of the knight. 
@@ -15,211 +71,444 @@ def add_legal_moves_constraints(solver: Glucose3, M: int, N: int, var: dict):
     positions that can be reached by enumerating the knight moves can
     be occupied at the next time step.
 
+    The clauses are generated for all cells and timesteps at once, by
+    shifting the array of variable ids by each move of KNIGHT_MOVES.
+
     @param solver: The solver instance to add constraints to.
     @param M: The number of rows in the chessboard.
     @param N: The number of columns in the chessboard.
-    @param var: A dictionary containing all the variables.
+    @param var: A VarLayout of all the variables. Pruned variables (see
+        VarLayout.is_kept) get no clause.
     """
 
-    T = M * N
-
-    # Forward constraints.
-    for t in range(T - 1):
-        for i in range(M):
-            for j in range(N):
+    ids = var.position_ids()
+    if len(ids) < 2:
+        return solver, var
 
-                v = var[(i, j, t)]
-                move_lits = []
+    # Forward constraints: v => legal moves <=> not v or (ORing legal_moves)
+    # A variable without legal move gets the unit clause not v.
+    nexts = np.stack([neighbour_ids(ids[1:], di, dj)
+                      for di, dj in KNIGHT_MOVES], axis=-1)
+    kept = ids[:-1] != 0
+    add_implication_clauses(solver, ids[:-1][kept], nexts[kept])
 
-                for di, dj in KNIGHT_MOVES:
-                    ni, nj = i + di, j + dj
-                    if valid_pos(ni, nj, M, N):
-                        move_lits.append(var[(ni, nj, t + 1)])
+    # Reverse constraints: if at (i,j) at t+1, must come from a legal
+    # position at t
+    prevs = np.stack([neighbour_ids(ids[:-1], -di, -dj)
+                      for di, dj in KNIGHT_MOVES], axis=-1)
+    kept = ids[1:] != 0
+    add_implication_clauses(solver, ids[1:][kept], prevs[kept])
 
-                if move_lits:
-                    # v => legal moves <=> not v and (ORing legal_moves)
-                    solver.add_clause([-v] + move_lits)
-                else:
-                    solver.add_clause([-v])
-    
-    # Reverse constraints: Ensure t+1 position is reachable from t
-    for t in range(T - 1):
-        for i in range(M):
-            for j in range(N):
-
-                v = var[(i, j, t + 1)]
-                prev_lits = []
-
-                for di, dj in KNIGHT_MOVES:
-                    pi, pj = i - di, j - dj
-                    if valid_pos(pi, pj, M, N):
-                        prev_lits.append(var[(pi, pj, t)])
-
-                if prev_lits:
-                    # If at (i,j) at t+1, must come from a legal position at t
-                    solver.add_clause([-v] + prev_lits)
-                else:
-                    # No position at t can reach (i,j), cannot be here at t+1
-                    solver.add_clause([-v])
-    
     return solver, var
 
-def add_cell_constraints_naive(solver: Glucose3, M: int, N: int, var: dict):
-    """Adds constraints enforcing that at each timestep, we visit a single 
-    cell.
+def add_closed_tour_constraints(solver, M, N, i0, j0, var):
+    """Adds the constraint closing a time-indexed tour: the last cell is a
+    knight move away from the start.
 
-    This function uses a naive, quadratic number of clauses to exlude
-    two cells from being visited at the same time step.
+    When pruning, the layout already keeps only these cells at the last
+    timestep (see VarLayout), and the clause is implied.
 
     @param solver: The solver instance to add constraints to.
-    @param M: Chessboard rows number.
-    @param N: Chessboard cols number.
-    @param T: Total timesteps.
-    @param var: A dictionary containing all the variables.
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param i0: The start row, or None when the start is left to the
+        assumptions: the constraint is then added for every start.
+    @param j0: The start column.
+    @param var: A VarLayout of all the variables.
     """
 
     T = M * N
-    
-    for t in range(T):
-        # Any cell in a snapshot can be visited at each time step
-        lits = [var[(i, j, t)] for i in range(M) for j in range(N)]
-        solver.add_clause(lits)
-
-        # Two cells cannot be visited in a same snapshot
-        # Take all different combinations of cells of a given snapshot
-        for first_cell in range(len(lits)):
-            for second_cell in range(first_cell + 1, len(lits)):
-                # not(A and B) <=> (not A or not b)
-                solver.add_clause([-lits[first_cell], -lits[second_cell]])
+    starts = [(i0, j0)] if i0 is not None else [(i, j) for i in range(M) for j in range(N)]
+    for i, j in starts:
+        guard = [] if i0 is not None else [-var.pos(i, j, 0)]
+        solver.add_clause(guard + [var[(i + di, j + dj, T - 1)] for di, dj in KNIGHT_MOVES
+                                   if (i + di, j + dj, T - 1) in var])
 
     return solver, var
 
-def add_time_constraints_naive(solver, M, N, var):
+def add_cell_constraints(solver, M, N, var, var_id, encoding='pairwise'):
+    """Adds constraints enforcing that at each timestep, we visit a single 
+    cell.
+
+    @param solver: The solver instance to add constraints to.
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param var: A VarLayout of all the variables.
+    @param var_id: The next free variable id.
+    @param encoding: The exactly-one encoding, see CARD_ENCODINGS.
+    """
+
+    start = var_id
+    for snapshot in var.position_ids():
+        # Any cell in a snapshot can be visited at each time step,
+        # two cells cannot be visited in a same snapshot
+        var_id = add_exactly_one(solver, snapshot[snapshot != 0], var_id, encoding)
+    var.add_aux('aux_1', start, var_id)
+
+    return solver, var, var_id
+
+def add_time_constraints(solver, M, N, var, var_id, encoding='pairwise'):
     """Adds constraints enforcing a given cell is visited at exactly 
     one time step.
 
-    This function uses a naive, quadratic number of clauses to exlude
-    two cells from being visited at the same time step.
-
     @param solver: The solver instance to add constraints to.
     @param M: The number of rows in the chessboard.
     @param N: The number of columns in the chessboard.
-    @param T: The number of timesteps.
-    @param var: A dictionary containing all the variables.
+    @param var: A VarLayout of all the variables.
+    @param var_id: The next free variable id.
+    @param encoding: The exactly-one encoding, see CARD_ENCODINGS.
     """
 
-    T = M * N
-
+    start = var_id
+    ids = var.position_ids()
     for i in range(M):
         for j in range(N):
-            # There must be at least one timestep for visiting the cell
-            lits = [var[(i, j, t)] for t in range(T)]
-            solver.add_clause(lits)
-            # Several timesteps cannot visit a same cell
-            for first_time in range(T):
-                for second_time in range(first_time + 1, T):
-                    solver.add_clause(
-                        [-var[(i, j, first_time)], -var[(i, j, second_time)]])
-    
+            # There must be at least one timestep for visiting the cell,
+            # several timesteps cannot visit a same cell
+            lits = ids[:, i, j]
+            var_id = add_exactly_one(solver, lits[lits != 0], var_id, encoding)
+    var.add_aux('aux_2', start, var_id)
+
+    return solver, var, var_id
+
+def add_cell_constraints_naive(solver: Glucose3, M: int, N: int, var: dict):
+    """add_cell_constraints with the pairwise encoding: a quadratic number
+    of clauses exclude two cells from being visited at the same time step.
+    """
+
+    add_cell_constraints(solver, M, N, var, var.next_id, 'pairwise')
+    return solver, var
+
+def add_time_constraints_naive(solver, M, N, var):
+    """add_time_constraints with the pairwise encoding."""
+
+    add_time_constraints(solver, M, N, var, var.next_id, 'pairwise')
     return solver, var
 
 def add_cell_constraints_sequential_counter(solver, M, N, var, var_id):
-    """Adds constraints enforcing that at each timestep, we visit a single 
-    cell.
+    """add_cell_constraints with the sequential counter encoding, which
+    adds a set of clauses linear w.r.t. the size of the problem.
+    """
+
+    return add_cell_constraints(solver, M, N, var, var_id, 'seqcounter')
+
+def add_time_constraints_sequential_counter(solver, M, N, var, var_id):
+    """add_time_constraints with the sequential counter encoding."""
+
+    return add_time_constraints(solver, M, N, var, var_id, 'seqcounter')
 
-    This function is more efficient as it uses sequential counter
-    encoding, which adds a set of clauses linear w.r.t. the size
-    of the problem.
+def add_successor_constraints(solver, M, N, i0, j0, var, var_id, closed=False):
+    """Adds the constraints of the successor encoding of a tour starting
+    at (i0, j0).
+
+    Instead of one variable per cell and timestep, there is one variable
+    per knight move (i, j) -> (ni, nj), true when the knight jumps from
+    (i, j) to (ni, nj): at most 8 variables per cell. Every cell but the
+    start is entered exactly once, the start is never entered, and every
+    cell is left at most once.
+
+    A closed tour is a cycle through every cell instead: every cell is
+    entered and left exactly once, and the start only matters to decode
+    the tours.
+
+    This still allows cycles disjoint from the path starting at (i0, j0).
+    They are removed lazily with add_subtour_elimination_constraints.
 
     @param solver: The solver instance to add constraints to.
     @param M: The number of rows in the chessboard.
     @param N: The number of columns in the chessboard.
-    @param T: The number of timesteps.
-    @param var: A dictionary containing all the variables.
+    @param i0: The start row, or None to leave the start open: each cell
+        then gets a selector variable, true when it is the start (see
+        SuccessorVars.start_assumptions).
+    @param j0: The start column.
+    @param var: A SuccessorVars dictionary, filled with the move variables.
+    @param var_id: The next free variable id.
+    @param closed: Whether the tour must come back to its start.
     """
 
     T = M * N
+    start = None if i0 is None else (i0, j0)
+    if closed:
+        # The start is entered like any other cell. When it is left open,
+        # its selectors only tag the tours blocked by the enumeration (see
+        # iter_successor_solutions), a cycle being a tour from every cell.
+        if start is None:
+            for i in range(M):
+                for j in range(N):
+                    var.selectors[(i, j)] = var_id
+                    var_id += 1
+        start = None
+
+    ins = {(i, j): [] for i in range(M) for j in range(N)}
+    outs = {(i, j): [] for i in range(M) for j in range(N)}
+    for i in range(M):
+        for j in range(N):
+            for di, dj in KNIGHT_MOVES:
+                ni, nj = i + di, j + dj
+                if valid_pos(ni, nj, M, N) and (ni, nj) != start:
+                    var[('next', i, j, ni, nj)] = var_id
+                    outs[(i, j)].append(var_id)
+                    ins[(ni, nj)].append(var_id)
+                    var_id += 1
+
+    for cell in ins:
+        selector = []
+        if closed:
+            # Left exactly once
+            solver.add_clause(outs[cell])
+        elif start is None:
+            var.selectors[cell] = var_id
+            selector = [var_id]
+            var_id += 1
+            # The start is never entered, and left unless it is the only cell
+            solver.append_formula([[-selector[0], -lit] for lit in ins[cell]])
+            if T > 1:
+                solver.add_clause([-selector[0]] + outs[cell])
+        # Entered exactly once, except the start which is never entered
+        if cell != start:
+            solver.add_clause(ins[cell] + selector)
+        for first, second in combinations(ins[cell], 2):
+            solver.add_clause([-first, -second])
+        # Left at most once
+        for first, second in combinations(outs[cell], 2):
+            solver.add_clause([-first, -second])
+
+    # The knight has to leave the start, unless it is the only cell
+    if start is not None and T > 1:
+        solver.add_clause(outs[start])
+
+    # No back and forth jumps, the smallest cycles
+    for (_, i, j, ni, nj), v in var.items():
+        back = var.get(('next', ni, nj, i, j))
+        if back is not None and (i, j) < (ni, nj):
+            solver.add_clause([-v, -back])
 
-    #print(f"add_cell_constraints_sequential_counter({solver}, {M}, {N}, {T}, {var}, {var_id}):")
-    for t in range(T):
-        # List of literals for all cells at time t
-        lits = [var[(i, j, t)] for i in range(M) for j in range(N)]
+    return solver, var, var_id
 
-        n = len(lits)
+def differing_codes(ids: np.ndarray, code: int) -> np.ndarray:
+    """The literals of which at least one is true when the bits ids, least
+    significant first, do not hold code.
 
-        # Case 1: 1x1 board (n = 1)
-        if n == 1:
-            solver.add_clause([lits[0]])  # The single cell must be visited
-            continue
-        
-        # Add clause: at least one cell is visited
-        solver.add_clause(lits)
-        
-        # Case 2: 1x2 or 2x1 board (n = 2)
+    @param ids: An (S, bits) array of variable ids.
+    @return: an (S, bits) array of literals.
+    """
+
+    set_bits = (code >> np.arange(ids.shape[1])) & 1
+    return np.where(set_bits == 1, -ids, ids)
+
+def equal_bits(prefix, a, b) -> list[list[int]]:
+    """The clauses making the bits a and b equal unless a literal of prefix
+    is true, each bit being a literal or a constant bool."""
+
+    if isinstance(a, bool) and isinstance(b, bool):
+        return [] if a == b else [prefix]
+    if isinstance(a, bool):
+        return [prefix + [b if a else -b]]
+    if isinstance(b, bool):
+        return [prefix + [a if b else -a]]
+    return [prefix + [-a, b], prefix + [a, -b]]
+
+def switch_clauses(s, x1, x2, y1, y2) -> list[list[int]]:
+    """The clauses of a switch of a permutation network: the bit vectors
+    (y1, y2) are (x1, x2) when s is false, and (x2, x1) when s is true."""
+
+    clauses = []
+    for prefix, pairs in (([s], ((x1, y1), (x2, y2))), ([-s], ((x2, y1), (x1, y2)))):
+        for x, y in pairs:
+            for a, b in zip(x, y):
+                clauses += equal_bits(prefix, a, b)
+    return clauses
+
+def add_permutation_network(solver, inputs, outputs, var_id):
+    """Adds the constraints making the bit vectors outputs a permutation of
+    the bit vectors inputs, through a Beneš network of arbitrary size.
+
+    The network of n vectors switches the pairs of inputs into a network of
+    n // 2 vectors and one of n - n // 2, the last input of an odd n going
+    to the second one, and switches their outputs back in pairs. Any
+    permutation can be routed this way, with O(n log n) switches, each one
+    a variable and a few clauses per bit.
+
+    @param solver: The solver instance to add constraints to.
+    @param inputs: n bit vectors of the same width, as lists of literals
+        or constant bools.
+    @param outputs: n bit vectors, as inputs.
+    @param var_id: The next free variable id.
+    @return: the next free variable id.
+    """
+
+    clauses = []
+
+    def route(inputs, outputs):
+        nonlocal var_id
+        n, width = len(inputs), len(inputs[0]) if inputs else 0
+        if n <= 1:
+            for x, y in zip(inputs, outputs):
+                for a, b in zip(x, y):
+                    clauses.extend(equal_bits([], a, b))
+            return
         if n == 2:
-            # Exactly one: (X_0 v X_1) ^ (!X_0 v !X_1)
-            solver.add_clause([-lits[0], -lits[1]])  # At most one
-            continue
-
-        aux = []
-        for k in range(n - 1):
-            var[('aux_1', k, t)] = var_id
-            aux.append(var_id)
+            clauses.extend(switch_clauses(var_id, *inputs, *outputs))
             var_id += 1
-        
-        solver.add_clause([-lits[0], aux[0]])               # First: !X_0 v a_0
-        for l in range(1, n - 1):
-            solver.add_clause([-lits[l], aux[l]])           #/ !X_i v a_i
-            solver.add_clause([-aux[l - 1], aux[l]])        #/ !a_{i-1} v a_i
-            solver.add_clause([-lits[l], -aux[l - 1]])      #/ !X_i v !a_{i-1}
-        solver.add_clause([-lits[-1], -aux[-2]])            #/ Last: !X_{n-1} v !a_{n-2}
-        
-    return solver, var, var_id
-
-def add_time_constraints_sequential_counter(solver, M, N, var, var_id):
-    """Adds constraints enforcing a given cell is visited at exactly 
-    one time step.
+            return
+
+        inner = ([], [], [], [])  # top inputs, bottom inputs, top outputs, bottom outputs
+        for k in range(n // 2):
+            for outer, (top, bottom) in ((inputs, inner[:2]), (outputs, inner[2:])):
+                s = var_id
+                a = list(range(var_id + 1, var_id + 1 + width))
+                b = list(range(var_id + 1 + width, var_id + 1 + 2 * width))
+                var_id += 1 + 2 * width
+                if outer is inputs:
+                    clauses.extend(switch_clauses(s, outer[2 * k], outer[2 * k + 1], a, b))
+                else:
+                    clauses.extend(switch_clauses(s, a, b, outer[2 * k], outer[2 * k + 1]))
+                top.append(a)
+                bottom.append(b)
+        if n % 2 == 1:
+            inner[1].append(inputs[-1])
+            inner[3].append(outputs[-1])
+        route(inner[0], inner[2])
+        route(inner[1], inner[3])
+
+    route(inputs, outputs)
+    solver.append_formula(clauses)
+    return var_id
+
+def add_log_constraints(solver, M, N, i0, j0, var, var_id, closed=False):
+    """Adds the constraints of the binary encoding of a tour starting at
+    (i0, j0), in which the cell of the knight at each timestep is written
+    in binary, on the row and column bits of a LogVars.
+
+    A move variable per timestep and knight move tells which move the knight
+    plays next, exactly one being true, and implies the offsets of the row
+    and of the column. The bits of the next cell follow from the bits of
+    the current cell and the offsets, one clause per row (or column),
+    offset and target bit: O(T (M log M + N log N)) clauses. The cells
+    of the timesteps are then routed to the cells of the board through a
+    permutation network (see add_permutation_network), which makes them
+    all different in O(T log^2 T) clauses, instead of the O(T^2) of the
+    time-indexed encodings.
 
     @param solver: The solver instance to add constraints to.
     @param M: The number of rows in the chessboard.
     @param N: The number of columns in the chessboard.
-    @param T: The number of timesteps.
-    @param var: A dictionary containing all the variables.
+    @param i0: The start row, or None to leave the start to the assumptions
+        (see LogVars.start_assumptions).
+    @param j0: The start column.
+    @param var: A LogVars of the position bits.
+    @param var_id: The next free variable id.
+    @param closed: Whether the tour must come back to its start.
     """
 
-    T = M * N
-
-    for i in range(M):
-        for j in range(N):
-            # List of literals for cell (i, j) across all time steps
-            lits = [var[(i, j, t)] for t in range(T)]
-            n = len(lits)
-            
-            # Case 1: T = 1 (n = 1)
-            if n == 1:
-                solver.add_clause([lits[0]])  # Cell must be visited at t = 0
-                continue
-            
-            # Add clause: cell is visited at least once
-            solver.add_clause(lits)
-            
-            # Case 2: T = 2 (n = 2)
-            if n == 2:
-                # Exactly one: (X_0 v X_1) ∧ (!X_0 v !X_1)
-                solver.add_clause([-lits[0], -lits[1]])  # At most one
+    T, rb = var.T, var.row_bits
+    ids = var.bit_ids()
+    rows, cols = ids[:, :rb], ids[:, rb:]
+
+    # Only the codes of the board
+    for code in range(M, 1 << rb):
+        solver.append_formula(differing_codes(rows, code).tolist())
+    for code in range(N, 1 << var.col_bits):
+        solver.append_formula(differing_codes(cols, code).tolist())
+
+    if i0 is not None:
+        solver.append_formula([[lit] for lit in var.path_ids([i0 * N + j0]).tolist()])
+
+    # Move k from timestep t to t + 1, and back to 0 for a closed tour
+    steps = T if closed and T > 1 else T - 1
+    if steps <= 0:
+        return solver, var, var_id
+    nxt = (np.arange(steps) + 1) % T
+    moves = np.arange(var_id, var_id + 8 * steps).reshape(steps, 8)
+    var.add_aux('moves', var_id, var_id + 8 * steps)
+    var_id += 8 * steps
+    for t in range(steps):
+        var_id = add_exactly_one(solver, moves[t].tolist(), var_id, 'pairwise')
+
+    # The offsets of the row and of the column of the move, each one
+    # implied by the moves having it
+    offsets = (-2, -1, 1, 2)
+    shifts = np.arange(var_id, var_id + 8 * steps).reshape(2, steps, 4)
+    var.add_aux('offsets', var_id, var_id + 8 * steps)
+    var_id += 8 * steps
+    for k, (di, dj) in enumerate(KNIGHT_MOVES):
+        for axis, d in ((0, di), (1, dj)):
+            implied = shifts[axis, :, offsets.index(d)]
+            solver.append_formula(np.stack([-moves[:, k], implied], axis=1).tolist())
+
+    for axis, (bits, size) in enumerate(((rows, M), (cols, N))):
+        for o, d in enumerate(offsets):
+            not_shift = -shifts[axis, :, o:o + 1]
+            for i in range(size):
+                # At i and shifted by d => at i + d next, on every bit
+                at_i = differing_codes(bits[:steps], i)
+                if not 0 <= i + d < size:
+                    clauses = np.concatenate([at_i, not_shift], axis=1)
+                    solver.append_formula(clauses.tolist())
+                    continue
+                target = -differing_codes(bits[nxt], i + d)
+                for b in range(bits.shape[1]):
+                    clauses = np.concatenate([at_i, not_shift, target[:, b:b + 1]], axis=1)
+                    solver.append_formula(clauses.tolist())
+
+    # Redundant, but helps propagation: the low bits of the row and the
+    # column change parity alternately, a knight move flipping exactly one
+    if rb and var.col_bits:
+        low = np.stack([rows[:steps, 0], rows[nxt, 0], cols[:steps, 0], cols[nxt, 0]], axis=1)
+        for signs in np.array(np.meshgrid(*[[1, -1]] * 4)).T.reshape(-1, 4):
+            if np.sum(signs < 0) % 2 == 0:
+                # Forbids the assignment of even parity making this clause false
+                solver.append_formula((low * signs).tolist())
+
+    # Every cell visited once: the cells of the timesteps are a permutation
+    # of the cells of the board. As the knight changes colour at each move,
+    # the timesteps of each parity go to the cells of one colour, when it
+    # is known: that of the start, or the majority colour of an odd board.
+    # The low column bit then follows from the others.
+    cells = np.arange(T)
+    first = var_id
+    if i0 is None and T % 2 == 0:
+        var_id = add_permutation_network(solver, ids.tolist(), var.codes(cells).tolist(), var_id)
+    else:
+        colour = 0 if i0 is None else (i0 + j0) % 2
+        compared = np.delete(np.arange(var.bits), rb) if rb and var.col_bits \
+            else np.arange(var.bits)
+        cell_colours = cells // N + cells % N
+        for parity in (0, 1):
+            targets = cells[cell_colours % 2 == (colour + parity) % 2]
+            at = ids[parity::2]
+            if len(at) != len(targets):
+                solver.add_clause([])  # A start on the minority colour
                 continue
+            var_id = add_permutation_network(solver, at[:, compared].tolist(),
+                                             var.codes(targets)[:, compared].tolist(), var_id)
+    var.add_aux('network', first, var_id)
 
-            aux = []
-            for k in range(n - 1):
-                var[('aux_2', k, i, j)] = var_id
-                aux.append(var_id)
-                var_id += 1
-
-            solver.add_clause([-lits[0], aux[0]])               # First: !X_0 v a_0
-            for l in range(1, n - 1):
-                solver.add_clause([-lits[l], aux[l]])           #/ !X_i v a_i
-                solver.add_clause([-aux[l - 1], aux[l]])        #/ !a_{i-1} v a_i
-                solver.add_clause([-lits[l], -aux[l - 1]])      #/ !X_i v !a_{i-1}
-            solver.add_clause([-lits[-1], -aux[-2]])            # Last: !X_{n-1} v !a_{n-2}
-            
     return solver, var, var_id
+
+def add_subtour_elimination_constraints(solver, M, N, var, cycles):
+    """Adds one constraint per cycle found apart from the path in a model
+    of the successor encoding: at least one move has to enter the cycle
+    cells from outside of them, or one of them is the start.
+
+    @param solver: The solver instance to add constraints to.
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param var: A SuccessorVars dictionary.
+    @param cycles: The cycles, as lists of cells.
+    """
+
+    for cycle in cycles:
+        inside = set(cycle)
+        lits = []
+        for i, j in cycle:
+            for di, dj in KNIGHT_MOVES:
+                pi, pj = i - di, j - dj
+                if valid_pos(pi, pj, M, N) and (pi, pj) not in inside:
+                    lit = var.get(('next', pi, pj, i, j))
+                    if lit is not None:
+                        lits.append(lit)
+        lits += [var.selectors[cell] for cell in cycle if cell in var.selectors]
+        solver.add_clause(lits)
+
+    return solver, var
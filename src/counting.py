@@ -0,0 +1,67 @@
+import numpy as np
+from constraints import KNIGHT_MOVES
+from helpers import valid_pos
+
+
+def knight_graph(M: int, N: int) -> list[list[int]]:
+    """Lists, for each cell index i * N + j, the indices of the cells
+    reachable with one knight move."""
+
+    adj = []
+    for i in range(M):
+        for j in range(N):
+            adj.append([ni * N + nj for di, dj in KNIGHT_MOVES
+                        for ni, nj in [(i + di, j + dj)]
+                        if valid_pos(ni, nj, M, N)])
+    return adj
+
+def popcounts(n_bits: int) -> np.ndarray:
+    """Number of bits set in each integer of [0, 2^n_bits[."""
+
+    counts = np.zeros(1, dtype=np.int64)
+    for _ in range(n_bits):
+        counts = np.concatenate([counts, counts + 1])
+    return counts
+
+def count_tours(M: int, N: int, max_cells: int = 20) -> tuple[list[list[int]], int]:
+    """Counts the knight's tours of an M x N board without any SAT model,
+    with a dynamic program over (visited set, current cell).
+
+    paths[mask, v] counts the knight paths visiting exactly the cells of
+    the bitmask mask and ending on v, whatever their start. The masks are
+    handled by number of visited cells, all the masks of a layer at once.
+    A tour starting on s, reversed, is a tour ending on s: the number of
+    tours starting on s is paths[full board, s].
+
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param max_cells: The largest board handled, the table having
+        2^(M * N) * M * N entries.
+    @return: the number of tours for each start square, as an M x N
+        matrix, and their total.
+    """
+
+    T = M * N
+    if T == 0:
+        return [[0] * N for _ in range(M)], 0
+    if T > max_cells:
+        raise ValueError(f"A {M}x{N} board has more than {max_cells} cells")
+
+    adj = knight_graph(M, N)
+    paths = np.zeros((1 << T, T), dtype=np.int64)
+    for v in range(T):
+        paths[1 << v, v] = 1
+
+    popcount = popcounts(T)
+    masks = np.arange(1 << T, dtype=np.int64)
+    for visited in range(1, T):
+        layer = masks[popcount == visited]
+        for v in range(T):
+            ending = layer[(layer >> v) & 1 == 1]
+            for u in adj[v]:
+                # Extend the paths ending on v to u, if u is not visited yet
+                free = ending[(ending >> u) & 1 == 0]
+                paths[free | (1 << u), u] += paths[free, v]
+
+    counts = paths[(1 << T) - 1].reshape(M, N)
+    return counts.tolist(), int(counts.sum())
@@ -1,3 +1,6 @@
+import numpy as np
+from time import perf_counter
+
 def valid_pos(i, j, M, N) -> bool:
     """Checks that a position is inside the chessboard."""
     return 0 <= i < M and 0 <= j < N
@@ -13,20 +16,338 @@ def leave_one_out_subsets(items) -> list[list]:
     subsets = [items[:i] + items[i+1:] for i in range(len(items))]
     return subsets
 
+
+class SuccessorVars(dict):
+    """Variables of the successor encoding ('succ' mode).
+
+    Maps ('next', i, j, ni, nj) to the id of the variable that is true
+    when the knight jumps from (i, j) to (ni, nj). The start cell is kept
+    along since a tour is decoded by following the jumps from it.
+
+    When the start is left open, selectors maps each cell to the variable
+    true when it is the start. Any cell of a closed tour can be its start:
+    the selectors are then free, and only tell the tours of each start
+    apart.
+    """
+
+    def __init__(self, i0=None, j0=None, closed=False):
+        super().__init__()
+        self.start = None if i0 is None else (i0, j0)
+        self.closed = closed
+        self.selectors = {}  # (i, j) -> variable id
+
+    def start_assumptions(self, i0, j0) -> list[int]:
+        """Assumptions making (i0, j0) the start, which is also recorded as
+        the cell the next tours are decoded from."""
+
+        if not self.selectors:
+            if self.closed:
+                self.start = (i0, j0)
+                return []
+            if self.start != (i0, j0):
+                raise ValueError(f"The start is fixed to {self.start}")
+            return []
+        self.start = (i0, j0)
+        return [v if cell == self.start else -v
+                for cell, v in self.selectors.items()]
+
+class VarLayout:
+    """Layout of the variables of the time-indexed encodings ('n' and 'sc'
+    modes), computing ids instead of storing them in a dict.
+
+    The variable true when the knight is at (i, j) at timestep t has id
+    t * M * N + i * N + j + 1. The auxiliary variables come after them,
+    and each family of auxiliary variables (e.g. 'aux_1' for the sequential
+    counters of the cell constraints) is kept as an id range [start, stop).
+
+    When pruning, the distances from the start are kept: the knight can
+    only be at (i, j) at timestep t if the cell is at most t moves away,
+    and at a timestep of the same parity as its distance, every move
+    changing the colour of the square (see is_kept). A closed tour also
+    has to come back to the start: at timestep t, it is at most T - t
+    moves away from it. Pruned positions keep their id but appear in no
+    clause.
+
+    The start square is kept as start, None while it is left to the
+    assumptions.
+    """
+
+    def __init__(self, M, N, dist=None, start=None, closed=False):
+        self.M, self.N, self.T = M, N, M * N
+        self.closed = closed
+        self.dist = None if dist is None else np.asarray(dist)
+        self.start = start
+        self.next_id = self.T * M * N + 1
+        self.aux = {}  # family name -> (start, stop)
+
+    def pos(self, i, j, t) -> int:
+        """Id of the (i, j, t) variable, whether pruned or not."""
+        return (t * self.M + i) * self.N + j + 1
+
+    def start_assumptions(self, i0, j0) -> list[int]:
+        """Assumptions making (i0, j0) the start square, which is also
+        recorded as start."""
+        self.start = (i0, j0)
+        return [self.pos(i0, j0, 0)]
+
+    def path_ids(self, path) -> np.ndarray:
+        """Ids of the (i, j, t) variables along a path of cell indices
+        i * N + j, one per timestep."""
+        return np.arange(len(path)) * self.T + np.asarray(path) + 1
+
+    def is_kept(self, i, j, t) -> bool:
+        """Tells whether (i, j, t) is on the board and not pruned."""
+
+        if not (valid_pos(i, j, self.M, self.N) and 0 <= t < self.T):
+            return False
+        if self.dist is None:
+            return True
+        d = self.dist[i, j]
+        horizon = min(t, self.T - t) if self.closed else t
+        return 0 <= d <= horizon and (t - d) % 2 == 0
+
+    def kept_mask(self) -> np.ndarray:
+        """Vectorized is_kept: a (T, M, N) boolean array."""
+
+        if self.dist is None:
+            return np.ones((self.T, self.M, self.N), dtype=bool)
+        dist = self.dist.reshape(1, self.M, self.N)
+        t = np.arange(self.T).reshape(-1, 1, 1)
+        horizon = np.minimum(t, self.T - t) if self.closed else t
+        return (dist >= 0) & (dist <= horizon) & ((t - dist) % 2 == 0)
+
+    def position_ids(self) -> np.ndarray:
+        """The ids of the (i, j, t) variables as a (T, M, N) array, 0 where
+        pruned. Built on demand, it is not kept by the layout."""
+
+        ids = np.arange(1, self.T * self.T + 1).reshape(self.T, self.M, self.N)
+        return np.where(self.kept_mask(), ids, 0)
+
+    def add_aux(self, name, start, stop):
+        """Records the ids [start, stop) as the auxiliary family name."""
+
+        self.aux[name] = (start, stop)
+        self.next_id = max(self.next_id, stop)
+
+    # Dict-like access, for code written against the former (i, j, t) dict
+
+    def __getitem__(self, key) -> int:
+        if not self.is_kept(*key):
+            raise KeyError(key)
+        return self.pos(*key)
+
+    def __contains__(self, key) -> bool:
+        return self.is_kept(*key)
+
+    def get(self, key, default=None):
+        return self.pos(*key) if self.is_kept(*key) else default
+
+    def values(self) -> list[int]:
+        """All the ids used by the encoding, positions then auxiliaries."""
+
+        ids = self.position_ids()
+        used = [ids[ids != 0]]
+        used += [np.arange(start, stop) for start, stop in self.aux.values()]
+        return np.concatenate(used).tolist()
+
+    def __len__(self) -> int:
+        aux = sum(stop - start for start, stop in self.aux.values())
+        return int(np.count_nonzero(self.kept_mask())) + aux
+
+class LogVars:
+    """Layout of the variables of the binary position encoding ('log' mode).
+
+    The cell of the knight at timestep t is written with row_bits bits for
+    its row and col_bits bits for its column, least significant first: bit
+    b of timestep t has id t * bits + b + 1, the row bits coming first. The
+    move variables and the auxiliary variables come after them, as id
+    ranges [start, stop) in aux, e.g. 'moves'.
+    """
+
+    def __init__(self, M, N, start=None):
+        self.M, self.N, self.T = M, N, M * N
+        self.row_bits = (M - 1).bit_length() if M > 0 else 0
+        self.col_bits = (N - 1).bit_length() if N > 0 else 0
+        self.bits = self.row_bits + self.col_bits
+        self.start = start
+        self.next_id = self.T * self.bits + 1
+        self.aux = {}  # family name -> (start, stop)
+
+    def bit_ids(self) -> np.ndarray:
+        """The ids of the position bits, as a (T, bits) array."""
+        return np.arange(1, self.T * self.bits + 1).reshape(self.T, self.bits)
+
+    def codes(self, path) -> np.ndarray:
+        """The bits of the cells of a path of cell indices, as a
+        (len(path), bits) boolean array."""
+
+        i, j = np.divmod(np.asarray(path, dtype=np.int64), self.N)
+        return np.concatenate([(i[:, None] >> np.arange(self.row_bits)) & 1,
+                               (j[:, None] >> np.arange(self.col_bits)) & 1],
+                              axis=1).astype(bool)
+
+    def path_ids(self, path) -> np.ndarray:
+        """The literals setting the position bits along a path of cell
+        indices, one group of bits per timestep from 0."""
+
+        ids = self.bit_ids()[:len(path)]
+        return np.where(self.codes(path), ids, -ids).ravel()
+
+    def start_assumptions(self, i0, j0) -> list[int]:
+        """Assumptions making (i0, j0) the start square, which is also
+        recorded as start."""
+        self.start = (i0, j0)
+        return self.path_ids([i0 * self.N + j0]).tolist()
+
+    def is_kept(self, i, j, t) -> bool:
+        """Tells whether (i, j, t) is a position of the encoding."""
+        return valid_pos(i, j, self.M, self.N) and 0 <= t < self.T
+
+    def add_aux(self, name, start, stop):
+        """Records the ids [start, stop) as the auxiliary family name."""
+
+        self.aux[name] = (start, stop)
+        self.next_id = max(self.next_id, stop)
+
+    def decode_paths(self, models) -> np.ndarray:
+        """The cell index visited at each timestep by each model, as a
+        (K, T) array."""
+
+        values = np.zeros((len(models), self.T * self.bits), dtype=np.int64)
+        for k, model in enumerate(models):
+            bits = np.asarray(model[:self.T * self.bits])
+            values[k, :len(bits)] = bits > 0
+        values = values.reshape(len(models), self.T, self.bits)
+        weights = np.concatenate([1 << np.arange(self.row_bits),
+                                  1 << np.arange(self.col_bits)])
+        rows = values[:, :, :self.row_bits] @ weights[:self.row_bits]
+        cols = values[:, :, self.row_bits:] @ weights[self.row_bits:]
+        return rows * self.N + cols
+
+    def values(self) -> list[int]:
+        """All the ids used by the encoding, position bits then auxiliaries."""
+
+        used = [self.bit_ids().ravel()]
+        used += [np.arange(start, stop) for start, stop in self.aux.values()]
+        return np.concatenate(used).tolist()
+
+    def __len__(self) -> int:
+        return self.T * self.bits + sum(stop - start for start, stop in self.aux.values())
+
+class ClauseCounter:
+    """Stands in for a solver when encoding, only counting the clauses."""
+
+    def __init__(self):
+        self.nof_clauses = 0
+
+    def add_clause(self, clause):
+        self.nof_clauses += 1
+
+    def append_formula(self, clauses):
+        self.nof_clauses += len(clauses)
+
+class ClauseList(ClauseCounter):
+    """Stands in for a solver when encoding, keeping the clauses, e.g. to
+    hand the same formula to several solvers."""
+
+    def __init__(self):
+        super().__init__()
+        self.clauses = []
+
+    def add_clause(self, clause):
+        super().add_clause(clause)
+        self.clauses.append(list(clause))
+
+    def append_formula(self, clauses):
+        super().append_formula(clauses)
+        self.clauses.extend(list(clause) for clause in clauses)
+
+class FamilyCounter:
+    """Hands the clauses of an encoding over to a solver, counting those
+    of each constraint family, the family of the next clauses being set
+    with begin_family, and timing the calls to the solver."""
+
+    def __init__(self, solver):
+        self.solver = solver
+        self.family = None
+        self.families = {}  # family name -> number of clauses
+        self.transfer_time = 0.0  # seconds spent in the solver
+
+    def add_clause(self, clause):
+        start = perf_counter()
+        self.solver.add_clause(clause)
+        self.transfer_time += perf_counter() - start
+        self.families[self.family] = self.families.get(self.family, 0) + 1
+
+    def append_formula(self, clauses):
+        start = perf_counter()
+        self.solver.append_formula(clauses)
+        self.transfer_time += perf_counter() - start
+        self.families[self.family] = self.families.get(self.family, 0) + len(clauses)
+
+def begin_family(solver, name):
+    """Tells a FamilyCounter that the next clauses belong to the
+    constraint family name. Nothing happens with any other solver."""
+
+    if isinstance(solver, FamilyCounter):
+        solver.family = name
+
+def decode_models(models, var) -> tuple[np.ndarray, np.ndarray]:
+    """Decodes a batch of SAT models of the time-indexed encodings at once.
+
+    The position part of each model is reshaped into a (T, M, N) array
+    and the cell visited at each timestep is read with an argmax. In 'log'
+    mode, the cells are read from the position bits instead.
+
+    @param models: SAT models, as returned by solver.get_model().
+    @param var: The VarLayout, or LogVars, the models were built with.
+    @return: the solutions, a (K, M, N) array holding the timestep at which
+        each cell is visited (-1 if never), and the paths, a (K, T) array
+        holding the index i * N + j of the cell visited at each timestep
+        (-1 if none).
+    """
+
+    T, M, N = var.T, var.M, var.N
+    if isinstance(var, LogVars):
+        paths = var.decode_paths(models)
+        solutions = np.full((len(models), T), -1)
+        np.put_along_axis(solutions, paths, np.arange(T), axis=1)
+        return solutions.reshape(-1, M, N), paths
+
+    values = np.zeros((len(models), T * T), dtype=bool)
+    for k, model in enumerate(models):
+        # model[] is 0-indexed while variables are 1-indexed, and ends at
+        # the last variable used in a clause
+        positions = np.asarray(model[:T * T])
+        values[k, :len(positions)] = positions > 0
+    # The ids of pruned positions are free in the solver: ignore them
+    values = values.reshape(-1, T, T) & var.kept_mask().reshape(1, T, T)
+
+    found = values.any(axis=2)
+    paths = np.where(found, values.argmax(axis=2), -1)
+    solutions = np.full((len(models), T), -1)
+    k, t = np.nonzero(found)
+    solutions[k, paths[k, t]] = t
+    return solutions.reshape(-1, M, N), paths
+
+def decode_model(model, var) -> tuple[list[list[int]], np.ndarray]:
+    """Decodes a single SAT model, see decode_models.
+
+    @return: the solution matrix and the path as an array of cell indices.
+    """
+
+    solutions, paths = decode_models([model], var)
+    return solutions[0].tolist(), paths[0]
+
 def model_to_solution(model, M, N, var) -> list[list]:
     """Helper function to convert a SAT model into a solution matrix."""
 
-    T = M * N
+    if isinstance(var, SuccessorVars):
+        solution, _ = successors_to_solution(
+            model_to_successors(model, var), M, N, var.start)
+        return solution
 
-    solution = [[-1 for _ in range(N)] for _ in range(M)]
-    for index in range(T):
-        for i in range(M):
-            for j in range(N):
-                # model[] is 0-indexed while variables are 1-indexed
-                # Check var(123) => check model[122]
-                if model[var[(i, j, index)] - 1] > 0:   # positive literal
-                    solution[i][j] = index
-                    break
+    solution, _ = decode_model(model, var)
     return solution
 
 def solutions_to_paths(solutions, M, N) -> tuple:
@@ -43,13 +364,60 @@ def solutions_to_paths(solutions, M, N) -> tuple:
              positions indexed by timestep).
     """
     T = M * N
-    paths = set()
-    for sol in solutions:
-        path = [None] * T
-        for i in range(M):
-            for j in range(N):
-                if sol[i][j] >= 0:
-                    path[sol[i][j]] = (i, j)
-        paths.add(tuple(path))
-    return tuple(paths)
- 
\ No newline at end of file
+    if len(solutions) == 0:
+        return ()
+
+    times = np.asarray(solutions).reshape(-1, T)
+    paths = np.full(times.shape, -1)
+    k, cell = np.nonzero(times >= 0)
+    paths[k, times[k, cell]] = cell
+
+    cells = [divmod(c, N) for c in range(T)] + [None]  # cells[-1] is None
+    return tuple(tuple(cells[c] for c in path)
+                 for path in np.unique(paths, axis=0).tolist())
+ 
+
+def model_to_successors(model, var) -> dict:
+    """Reads the jumps set in a SAT model of the successor encoding.
+
+    @return: a dict (i, j) -> (ni, nj) of the cells the knight jumps to.
+    """
+
+    successors = {}
+    for (_, i, j, ni, nj), v in var.items():
+        if model[v - 1] > 0:
+            successors[(i, j)] = (ni, nj)
+    return successors
+
+def successors_to_solution(successors, M, N, start) -> tuple[list[list[int]], list]:
+    """Follows the jumps from the start cell to build a solution matrix.
+
+    The cells that are not reached from the start are left to -1: with the
+    successor encoding, they form cycles disjoint from the path. A closed
+    tour is followed until it comes back to the start.
+
+    @return: the solution matrix and the list of cycles (lists of cells).
+    """
+
+    solution = [[-1 for _ in range(N)] for _ in range(M)]
+    cell, t = start, 0
+    while cell is not None and solution[cell[0]][cell[1]] == -1:
+        solution[cell[0]][cell[1]] = t
+        cell = successors.get(cell)
+        t += 1
+
+    cycles = []
+    for cell in successors:
+        if solution[cell[0]][cell[1]] != -1:
+            continue
+        cycle = []
+        while solution[cell[0]][cell[1]] == -1:
+            solution[cell[0]][cell[1]] = -2  # mark as seen
+            cycle.append(cell)
+            cell = successors[cell]
+        cycles.append(cycle)
+
+    for cycle in cycles:
+        for i, j in cycle:
+            solution[i][j] = -1
+    return solution, cycles
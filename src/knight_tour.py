@@ -1,87 +1,454 @@
-from pysat.solvers import Glucose3
+from pysat.solvers import Solver, SolverNames
 from constraints import *
-from helpers import solutions_to_paths, model_to_solution
+from helpers import (model_to_solution, decode_model,
+                     VarLayout, SuccessorVars, LogVars, ClauseCounter,
+                     FamilyCounter, begin_family,
+                     model_to_successors, successors_to_solution)
 from plot import *
+from symmetry import add_symmetry_breaking_constraints, add_reversal_breaking_constraints
+from cnf_cache import cached_formula, add_formula
+from warnsdorff import (warnsdorff_path, is_knight_tour, path_literals,
+                        path_to_solution, warnsdorff_hint, TourSolver)
+from store import SolutionStore
+from profiling import profiled
+import os
 import random
+import tempfile
 
-def extract_solution(solver: Glucose3, M: int, N: int, var: dict) -> tuple[list[list[int]], bool]: 
+def run_solver(solver: Solver, assumptions=[], budget=None, profile=None) -> bool | None:
+    """Solves under assumptions, within the budget if any (see Budget),
+    timing the search and recording the solver statistics in the profile
+    if any (see Profile).
+
+    @return: whether the formula is satisfiable, or None if the budget ran
+        out first.
+    """
+
+    with profiled(profile, 'search'):
+        if budget is None:
+            res = solver.solve(assumptions=assumptions)
+        else:
+            res = budget.solve(solver, assumptions)
+    if profile is not None:
+        profile.solver_stats(solver)
+        profile.record['result'] = res
+    return res
+
+def extract_solution(solver: Solver, M: int, N: int, var: dict,
+                     assumptions=[], warnsdorff=False, budget=None,
+                     profile=None) -> tuple[list[list[int]], bool | None]: 
     """Return one solution from the solver.
     
     If no solutions, returns a -1 initialized list.
+
+    @param assumptions: Literals assumed for this call only, e.g. the
+        start square of a board built with build_knight_board.
+    @param warnsdorff: Whether to try a tour built with Warnsdorff's rule
+        first, see warnsdorff_hint.
+    @param budget: A Budget limiting the search. When it runs out, the
+        result is None instead of True or False, with a -1 initialized list.
+    @param profile: A Profile recording the search and decoding times and
+        the solver statistics.
     """
 
-    if not solver.solve():
-        return [[-1 for _ in range(N)] for _ in range(M)], False
+    if isinstance(solver, TourSolver) and solver.agrees(assumptions):
+        # The tour of the fast path, without a T^2 model to decode
+        if profile is not None:
+            profile.record['result'] = True
+        with profiled(profile, 'decode'):
+            return path_to_solution(solver.path, M, N), True
+
+    if warnsdorff:
+        with profiled(profile, 'warnsdorff'):
+            hinted = warnsdorff_hint(solver, M, N, var, assumptions)
+        if hinted:
+            with profiled(profile, 'decode'):
+                return model_to_solution(solver.get_model(), M, N, var), True
+
+    if isinstance(var, SuccessorVars):
+        return extract_successor_solution(solver, M, N, var, assumptions, budget,
+                                          profile)
+
+    res = run_solver(solver, assumptions, budget, profile)
+    if not res:
+        return [[-1 for _ in range(N)] for _ in range(M)], res
+
+    with profiled(profile, 'decode'):
+        model = solver.get_model()  # list of all the variables
+        return model_to_solution(model, M, N, var), True
+
+def extract_successor_solution(solver: Solver, M: int, N: int, var: SuccessorVars,
+                               assumptions=[], budget=None, profile=None):
+    """Return one solution from a solver built in successor mode.
 
-    model = solver.get_model()  # list of all the variables
-    return model_to_solution(model, M, N, var), True
+    Each model containing cycles apart from the path gets these cycles
+    forbidden, and the solver is called again, until a tour is found
+    or the problem becomes unsatisfiable. The budget, if any, is shared
+    by all these calls.
+    """
+
+    res = run_solver(solver, assumptions, budget, profile)
+    while res:
+        with profiled(profile, 'decode'):
+            successors = model_to_successors(solver.get_model(), var)
+            solution, cycles = successors_to_solution(successors, M, N, var.start)
+        if not cycles:
+            return solution, True
+        add_subtour_elimination_constraints(solver, M, N, var, cycles)
+        res = run_solver(solver, assumptions, budget, profile)
+
+    return [[-1 for _ in range(N)] for _ in range(M)], res
 
-def extract_all_solutions(solver: Glucose3, M: int, N: int, var: dict):
-    """Return all the solutions from the solver."""
+def extract_all_solutions(solver: Solver, M: int, N: int, var: dict,
+                          assumptions=[], sink=None, budget=None, profile=None):
+    """Return all the solutions from the solver.
 
-    res = False
-    solutions = []
+    @param sink: A SolutionStore to write the solutions to as they are
+        found, instead of keeping them in a list. It is returned in place
+        of the list.
+    @param budget: A Budget limiting the whole enumeration. When it runs
+        out, the solutions found so far are returned, and the result is
+        None instead of whether there is any.
+    @param profile: A Profile recording the search and decoding times, the
+        solver statistics and the number of solutions.
+    """
 
-    if solver.solve():
-        res = True
-        seen = set()
-        for model in solver.enum_models():  # list of all the variables
-            solution = model_to_solution(model, M, N, var)
-            # Convert to tuple of tuples for hashing
-            sol_tuple = tuple(tuple(row) for row in solution)
-            if sol_tuple not in seen:
-                seen.add(sol_tuple)
-                solutions.append(solution)
+    if sink is not None:
+        # Whether the solver found a tour, even one the store already held
+        found = False
+        for solution in iter_solutions(solver, M, N, var, assumptions, budget, profile):
+            sink.add(solution)
+            found = True
+        sink.flush()
+        res = None if budget is not None and budget.exhausted else found
+        if profile is not None:
+            profile.record.update(solutions=len(sink), result=res)
+        return sink, res
 
+    solutions = list(iter_solutions(solver, M, N, var, assumptions, budget, profile))
+    res = len(solutions) > 0
+    if budget is not None and budget.exhausted:
+        res = None
+    if profile is not None:
+        profile.record.update(solutions=len(solutions), result=res)
     return solutions, res
 
-def build_knight_tour(M, N, i0, j0, mode='n'):
+def iter_solutions(solver: Solver, M: int, N: int, var: dict, assumptions=[],
+                   budget=None, profile=None):
+    """Yield each distinct solution of the solver as soon as it is found.
+
+    The enumeration is projected onto the position variables: each tour
+    is blocked by a clause over its T true (i, j, t) literals only, so
+    that the auxiliary variables, and the unused ids of the pruned
+    positions, never make the solver find the same tour twice. Nothing
+    is kept between two solutions.
+
+    The blocking clauses stay in the solver: with assumptions, the tours
+    of one start square are only enumerated once.
+
+    With a budget, the enumeration also stops when it runs out, which
+    budget.exhausted tells. With a profile, the search and the decoding
+    times are summed over the solutions.
+    """
+
+    if isinstance(var, SuccessorVars):
+        yield from iter_successor_solutions(solver, M, N, var, assumptions, budget,
+                                            profile)
+        return
+
+    while run_solver(solver, assumptions, budget, profile):
+        with profiled(profile, 'decode'):
+            model = solver.get_model()  # list of all the variables
+            solution, path = decode_model(model, var)
+        solver.add_clause((-var.path_ids(path)).tolist())
+        yield solution
+
+def iter_successor_solutions(solver: Solver, M: int, N: int, var: SuccessorVars,
+                             assumptions=[], budget=None, profile=None):
+    """Yield each solution of a solver built in successor mode.
+
+    Each tour found is blocked on its own moves only, and each model with
+    cycles apart from the path gets them forbidden.
+    """
+
+    while run_solver(solver, assumptions, budget, profile):
+        with profiled(profile, 'decode'):
+            successors = model_to_successors(solver.get_model(), var)
+            solution, cycles = successors_to_solution(successors, M, N, var.start)
+        if cycles:
+            add_subtour_elimination_constraints(solver, M, N, var, cycles)
+            continue
+        # Block this tour: at least one of its moves must change, or, for
+        # a closed tour with an open start, the start
+        block = [-var[('next', i, j, ni, nj)] for (i, j), (ni, nj) in successors.items()]
+        if var.closed and var.selectors:
+            block.append(-var.selectors[var.start])
+        solver.add_clause(block)
+        yield solution
+
+def count_solutions(solver: Solver, M: int, N: int, var: dict,
+                    assumptions=[], budget=None) -> int:
+    """Count the solutions of the solver without keeping them.
+
+    With a budget, the count is only a lower bound once budget.exhausted.
+    """
+
+    return sum(1 for _ in iter_solutions(solver, M, N, var, assumptions, budget))
+
+# Default exactly-one encoding of each mode, see CARD_ENCODINGS
+MODE_ENCODINGS = {'n': 'pairwise', 'sc': 'seqcounter'}
+
+# Backends that can neither take clauses after a solve nor assumptions,
+# which the blocking clauses, the subtour cuts and the start squares need
+NON_INCREMENTAL = set(SolverNames.kissat404)
+
+def check_incremental(solver_name):
+    """Raises a ValueError for a backend of NON_INCREMENTAL."""
+
+    if solver_name in NON_INCREMENTAL:
+        raise ValueError(f"The {solver_name!r} backend is not incremental, "
+                         f"choose e.g. 'glucose3' or 'cadical195'")
+
+def build_knight_tour(M, N, i0, j0, mode='n', prune=True, symmetry_breaking=False,
+                      cell_encoding=None, time_encoding=None, solver_name='glucose3',
+                      cache=False, warnsdorff=False, closed=False,
+                      merge_reversals=False, profile=None):
     """Orchestrator to build the Knight's Tour problem, adding constraints.
 
     @param M: The number of rows in the chessboard.
     @param N: The number of columns in the chessboard.
     @param i0: The start row (0-indexed)
     @param j0: The start column (0-indexed)
-    @param mode: Whether to use naive or efficient constraints.
+    @param mode: 'n' for naive constraints, 'sc' for sequential counters,
+        'succ' for the compact successor encoding (one variable per knight
+        move instead of one per cell and timestep), 'log' for the binary
+        encoding of the cell at each timestep (see add_log_constraints).
+        The 'log' mode has no (i, j, t) variables to prune, and ignores the
+        exactly-one encodings. Its formula grows as T log^2 T instead of
+        T^2, and is the smallest from about 16x16 on, but the solvers
+        find its tours much more slowly than with 'sc'.
+    @param prune: Whether to leave out the (i, j, t) variables that can never
+        be true (see VarLayout.is_kept), along with their clauses. In every mode,
+        the formula is also made unsatisfiable up front when the start
+        square has the wrong colour (see colours_allow_tour).
+    @param symmetry_breaking: Whether to keep a single tour per symmetry
+        class (see add_symmetry_breaking_constraints). Not available in
+        'succ' and 'log' modes.
+    @param cell_encoding: The exactly-one encoding of the cell constraints
+        (one cell per timestep), among CARD_ENCODINGS. Defaults to the
+        encoding of the mode, 'pairwise' for 'n' and 'seqcounter' for 'sc'.
+    @param time_encoding: The same for the time constraints (one timestep
+        per cell).
+    @param solver_name: The pysat backend, e.g. 'glucose3', 'glucose4',
+        'cadical195', 'maplechrono' or 'lingeling'. It must be incremental:
+        the extract functions add clauses between two solves, which rules
+        out 'kissat404' (see NON_INCREMENTAL).
+    @param cache: Whether to load the formula from the on-disk CNF cache,
+        encoding and storing it only the first time (see cnf_cache).
+    @param warnsdorff: Whether to build a tour with Warnsdorff's rule first
+        (see warnsdorff_path). When it succeeds, in 'n' and 'sc' modes
+        without symmetry breaking, the formula is only encoded if the
+        solver is asked for more than this tour (see TourSolver).
+        Otherwise the path found becomes the preferred phases of the
+        solver.
+    @param closed: Whether the tour must be closed: its last cell is a
+        knight move away from the start. Any cell of a closed tour can be
+        its start, and pruning uses the way back to the start as well (see
+        VarLayout).
+    @param merge_reversals: Whether to keep a single tour out of each
+        closed tour and its reversal (see add_reversal_breaking_constraints).
+    @param profile: A Profile recording the parameters, the encoding and
+        transfer times and the size of each constraint family (see
+        encode_or_load).
     """
 
-    solver = Glucose3()
-    T = M * N
-    vars = {}  # (i, j, t) -> variable id
-
-    # Populating dict for each i, j, timestep
-    var_id = 1
-    for t in range(T):
-        for i in range(M):
-            for j in range(N):
-                vars[(i, j, t)] = var_id
-                var_id += 1
-
-    solver.add_clause([vars[(i0, j0, 0)]])
-    if (mode == 'n'):
-        _, _ = add_cell_constraints_naive(solver, M, N, vars)
-        _, _ = add_time_constraints_naive(solver, M, N, vars)
-    elif (mode == 'sc'):
-        _, _, var_id = add_cell_constraints_sequential_counter(solver, M, N, vars, var_id)
-        _, _, var_id = add_time_constraints_sequential_counter(solver, M, N, vars, var_id)
-    add_legal_moves_constraints(solver, M, N, vars)
+    check_incremental(solver_name)
+    if profile is not None:
+        profile.record.update(M=M, N=N, i0=i0, j0=j0, mode=mode, solver=solver_name)
+    if warnsdorff:
+        with profiled(profile, 'warnsdorff'):
+            path = warnsdorff_path(M, N, i0, j0)
+        if mode in MODE_ENCODINGS and not symmetry_breaking and not closed and \
+                is_knight_tour(path, M, N, i0, j0):
+            dist = knight_distances(M, N, i0, j0) if prune else None
+            vars = VarLayout(M, N, dist, (i0, j0))
+            return TourSolver(path, vars, lambda: build_knight_tour(
+                M, N, i0, j0, mode, prune, symmetry_breaking, cell_encoding,
+                time_encoding, solver_name, cache)), vars
 
+    solver = Solver(name=solver_name)
+    vars = encode_or_load(solver, cache, M, N, i0, j0, mode, prune, symmetry_breaking,
+                          cell_encoding, time_encoding, closed, merge_reversals,
+                          profile=profile)
+    if warnsdorff:
+        solver.set_phases(path_literals(path, M, N, vars))
     return solver, vars
 
+def build_knight_board(M, N, mode='n', cell_encoding=None, time_encoding=None,
+                       solver_name='glucose3', cache=False, closed=False,
+                       merge_reversals=False, profile=None):
+    """Builds the Knight's Tour problem of an M x N board once for all the
+    start squares.
+
+    The start square is chosen per call by passing
+    vars.start_assumptions(i0, j0) as assumptions to the extract functions,
+    so that the encoding and the learned clauses are reused by all the
+    start squares. Pruning and symmetry breaking depend on the start square
+    and are not used.
+
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param mode: 'n', 'sc', 'succ' or 'log', see build_knight_tour.
+    @param cell_encoding: See build_knight_tour.
+    @param time_encoding: See build_knight_tour.
+    @param solver_name: The pysat backend, see build_knight_tour.
+    @param cache: See build_knight_tour.
+    @param closed: See build_knight_tour.
+    @param merge_reversals: See build_knight_tour.
+    @param profile: See build_knight_tour.
+    """
+
+    check_incremental(solver_name)
+    if profile is not None:
+        profile.record.update(M=M, N=N, mode=mode, solver=solver_name)
+    solver = Solver(name=solver_name)
+    vars = encode_or_load(solver, cache, M, N, None, None, mode, False, False,
+                          cell_encoding, time_encoding, closed, merge_reversals,
+                          profile=profile)
+    return solver, vars
+
+def encode_or_load(solver, cache, *params, profile=None):
+    """Adds encode_knight_tour(solver, *params) to the solver, or the same
+    formula from the CNF cache, and returns the variables.
+
+    With a profile, the clauses go through a FamilyCounter, which counts
+    them per constraint family and times their transfer to the solver, so
+    that it can be told apart from the time to encode them.
+    """
+
+    if not cache and profile is None:
+        return encode_knight_tour(solver, *params)
+
+    if not cache:
+        counter = FamilyCounter(solver)
+        with profile.phase('encode'):
+            vars = encode_knight_tour(counter, *params)
+        profile.add_time('encode', -counter.transfer_time)
+        profile.add_time('transfer', counter.transfer_time)
+        profile.count_formula(counter.families, vars)
+        return vars
+
+    with profiled(profile, 'encode'):
+        clauses, vars = cached_formula(
+            lambda formula: encode_knight_tour(formula, *params), *params)
+    with profiled(profile, 'transfer'):
+        add_formula(solver, clauses)
+    if profile is not None:
+        profile.count_formula({'total': sum(len(group) for group in clauses)}, vars)
+    return vars
+
+def encode_knight_tour(solver, M, N, i0, j0, mode='n', prune=True,
+                       symmetry_breaking=False, cell_encoding=None,
+                       time_encoding=None, closed=False, merge_reversals=False):
+    """Adds the Knight's Tour constraints to a solver, or anything with
+    add_clause and append_formula methods, and returns the variables.
+
+    See build_knight_tour for the parameters. With i0 and j0 set to None,
+    the start square is left to the assumptions (see build_knight_board).
+    A FamilyCounter also gets the number of clauses of each constraint
+    family.
+    """
+
+    if merge_reversals and not closed:
+        raise ValueError("Only closed tours can be merged with their reversal")
+    begin_family(solver, 'start')
+    if closed and M * N % 2 == 1:
+        # The knight changes colour at each move: a cycle has even length
+        solver.add_clause([])
+    if i0 is not None and prune and not colours_allow_tour(M, N, i0, j0):
+        solver.add_clause([])
+
+    if mode == 'succ':
+        if symmetry_breaking:
+            raise ValueError("Symmetry breaking needs the (i, j, t) variables")
+        vars = SuccessorVars(i0, j0, closed)
+        begin_family(solver, 'successors')
+        _, _, _ = add_successor_constraints(solver, M, N, i0, j0, vars, 1, closed)
+        if merge_reversals:
+            begin_family(solver, 'reversals')
+            add_reversal_breaking_constraints(solver, M, N, i0, j0, vars)
+        return vars
+
+    if mode == 'log':
+        if symmetry_breaking:
+            raise ValueError("Symmetry breaking needs the (i, j, t) variables")
+        if merge_reversals:
+            raise ValueError("Merging reversals is not available in 'log' mode")
+        vars = LogVars(M, N, None if i0 is None else (i0, j0))
+        begin_family(solver, 'log')
+        _, _, _ = add_log_constraints(solver, M, N, i0, j0, vars, vars.next_id, closed)
+        return vars
+
+    # (i, j, t) -> variable id, computed by the layout
+    dist = knight_distances(M, N, i0, j0) if prune and i0 is not None else None
+    vars = VarLayout(M, N, dist, None if i0 is None else (i0, j0), closed)
+    var_id = vars.next_id
+
+    if i0 is not None:
+        solver.add_clause([vars[(i0, j0, 0)]])
+    if closed:
+        begin_family(solver, 'closed')
+        add_closed_tour_constraints(solver, M, N, i0, j0, vars)
+        if merge_reversals:
+            begin_family(solver, 'reversals')
+            add_reversal_breaking_constraints(solver, M, N, i0, j0, vars)
+    begin_family(solver, 'cell')
+    _, _, var_id = add_cell_constraints(solver, M, N, vars, var_id,
+                                        cell_encoding or MODE_ENCODINGS[mode])
+    begin_family(solver, 'time')
+    _, _, var_id = add_time_constraints(solver, M, N, vars, var_id,
+                                        time_encoding or MODE_ENCODINGS[mode])
+    begin_family(solver, 'legal_moves')
+    add_legal_moves_constraints(solver, M, N, vars)
+    if symmetry_breaking:
+        begin_family(solver, 'symmetry')
+        _, _, var_id = add_symmetry_breaking_constraints(solver, M, N, i0, j0, vars, var_id)
+
+    return vars
+
+def pruning_report(M, N, i0, j0, mode='n') -> dict:
+    """Reports how many variables and clauses the pruning of the (i, j, t)
+    variables removes, by counting both encodings without solving them.
+
+    The pruned variables keep their ids, which the solver still allocates:
+    unused_variables counts the variables left out of every clause.
+    """
+
+    full, pruned = ClauseCounter(), ClauseCounter()
+    full_vars = encode_knight_tour(full, M, N, i0, j0, mode, prune=False)
+    pruned_vars = encode_knight_tour(pruned, M, N, i0, j0, mode, prune=True)
+
+    return {
+        'variables': len(full_vars),
+        'clauses': full.nof_clauses,
+        'unused_variables': len(full_vars) - len(pruned_vars),
+        'removed_clauses': full.nof_clauses - pruned.nof_clauses,
+    }
+
 def solve_with_constraints(extra_constraints, M, N, i0, j0):
     """ Builds the knight tour problem with additional specified constraints 
     and solves it, returning all solutions.
     """
 
     solver, vars = build_knight_tour(M, N, i0, j0, mode='sc')
-    for ec in extra_constraints:
-        lit = vars[ec]
+    for t, i, j in extra_constraints:
+        lit = vars[(i, j, t)]
         solver.add_clause([lit])
 
     sols, _ = extract_all_solutions(solver, M, N, vars)
     return sols
 
-def uniqueness_constraints(M, N, i0, j0) -> list:
+def uniqueness_constraints(M, N, i0, j0, incremental=True, store=None) -> list:
     """Computes a minimal set of constraints that, once added to the
     solver, leaves exactly one solution for the M x N Knight's Tour
     starting at (i0, j0).
@@ -90,33 +457,48 @@ def uniqueness_constraints(M, N, i0, j0) -> list:
     Add a strictly smaller subset of them to the SAT solver will make it output
     several solutions.
 
+    @param incremental: Whether to let the SAT solver find the tours to
+        exclude (see incremental_uniqueness_constraints) rather than
+        enumerating all of them first.
+    @param store: Without incremental, the path of the SolutionStore the
+        tours are enumerated to and read back from, lazily. A temporary
+        file by default.
     @return: constraints written as (t, i, j)
     """
 
+    if incremental:
+        return incremental_uniqueness_constraints(M, N, i0, j0)
+    if store is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            return uniqueness_constraints(M, N, i0, j0, False,
+                                          os.path.join(tmp, 'tours.bin'))
+
     random.seed()
     T = M * N
 
     solver, variables = build_knight_tour(M, N, i0, j0, mode='sc')
-    solutions, has_solution = extract_all_solutions(solver, M, N, variables)
+    with SolutionStore(store, M, N, dedup=True) as sink:
+        extract_all_solutions(solver, M, N, variables, sink=sink)
+        # Paths: path[t] = i * N + j, the cell the knight is on at t
+        paths = sink.paths()
 
     # 0 or 1 solution is already unique
-    if not has_solution or len(solutions) <= 1:
+    if len(paths) <= 1:
         return []
 
-    # Build paths: path[t] = (i,j) represents where the knight was at t
-    paths = solutions_to_paths(solutions, M, N)
-    ref_path = random.choice(paths)
+    ref = random.randrange(len(paths))
+    ref_path = paths[ref]
     
     constraints = set()  # (t, i, j) constraints
     
-    for alt_path in paths:
-        if alt_path is ref_path:
+    for k, alt_path in enumerate(paths):
+        if k == ref:
             continue
 
         # If a constraint gathered so far already contradicts alt_path,
         # alt_path is already impossible: no new constraint is needed.
         already_excluded = any(
-            alt_path[t] != (i, j) for (t, i, j) in constraints
+            alt_path[t] != i * N + j for (t, i, j) in constraints
         )
         if already_excluded:
             continue
@@ -125,12 +507,62 @@ def uniqueness_constraints(M, N, i0, j0) -> list:
         # (t = 0 is skipped, since every path starts at the same cell)
         for t in range(1, T):  
             if alt_path[t] != ref_path[t]:
-                i, j = ref_path[t]
+                i, j = divmod(int(ref_path[t]), N)
                 constraints.add((t, i, j))
                 break
 
     # Uncomment to see all solutions instances and 
     # compare with the returned constraints.
-    #rainbow_plot_all(solutions, "test_uniqueness_constraints")
+    #rainbow_plot_all(SolutionStore(store).solutions(), "test_uniqueness_constraints")
+
+    return list(constraints)
+
+def incremental_uniqueness_constraints(M, N, i0, j0) -> list:
+    """Computes the constraints of uniqueness_constraints on a single
+    incremental solver, without enumerating the tours.
+
+    A random reference tour is found, then blocked. Each tour the solver
+    still finds under the constraints gathered so far (passed as
+    assumptions) yields one more constraint: the reference position at
+    their first point of divergence. Once none is left, each constraint
+    that the others make useless is dropped, which leaves a minimal set.
+    The number of solver calls depends on the number of constraints, not
+    on the number of tours.
+
+    @return: constraints written as (t, i, j)
+    """
+
+    random.seed()
+    T = M * N
+
+    solver, variables = build_knight_tour(M, N, i0, j0, mode='sc')
+    # Random phases, so that the reference tour changes between calls
+    solver.set_phases([v if random.random() < 0.5 else -v
+                       for v in range(1, variables.next_id)])
+    if not solver.solve():
+        return []
+    _, ref_path = decode_model(solver.get_model(), variables)
+
+    # From now on, only the tours different from the reference are found
+    solver.add_clause((-variables.path_ids(ref_path)).tolist())
+
+    def assumptions(constraints):
+        return [variables[(i, j, t)] for t, i, j in constraints]
+
+    constraints = []  # (t, i, j) constraints
+    while solver.solve(assumptions=assumptions(constraints)):
+        _, alt_path = decode_model(solver.get_model(), variables)
+        # First point of divergence with ref_path
+        # (t = 0 is skipped, since every path starts at the same cell)
+        t = next(t for t in range(1, T) if alt_path[t] != ref_path[t])
+        i, j = divmod(int(ref_path[t]), N)
+        constraints.append((t, i, j))
+
+    # Shrink to a minimal set: removing any constraint left lets another
+    # tour through
+    for constraint in list(constraints):
+        others = [c for c in constraints if c != constraint]
+        if not solver.solve(assumptions=assumptions(others)):
+            constraints = others
 
-    return list(constraints)
\ No newline at end of file
+    return constraints
\ No newline at end of file
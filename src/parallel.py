@@ -0,0 +1,244 @@
+import multiprocessing as mp
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pysat.solvers import Solver
+from constraints import KNIGHT_MOVES, add_subtour_elimination_constraints
+from helpers import (ClauseList, SuccessorVars, model_to_solution,
+                     model_to_successors, successors_to_solution)
+from knight_tour import (encode_knight_tour, extract_solution, iter_solutions,
+                         count_solutions, check_incremental)
+from budget import supports_interrupt
+
+# Backends with rather different heuristics, to race against each other
+DEFAULT_PORTFOLIO = ('glucose3', 'cadical195', 'maplechrono', 'lingeling')
+
+# The conflicts between two checks of stop, on the backends that cannot be
+# interrupted
+CUBE_SLICE_CONFLICTS = 5000
+
+# How often the portfolio checks for crashed workers, in seconds
+PORTFOLIO_POLL = 0.5
+
+def portfolio_worker(name, clauses, M, N, var, assumptions, results):
+    """Solves the formula with one backend and reports to the results
+    queue, as (name, solution, res), or (name, None, error message)."""
+
+    try:
+        with Solver(name=name, bootstrap_with=clauses) as solver:
+            solution, res = extract_solution(solver, M, N, var, assumptions)
+        results.put((name, solution, res))
+    except Exception as e:
+        results.put((name, None, f"{type(e).__name__}: {e}"))
+
+def solve_portfolio(M, N, i0, j0, mode='sc', solver_names=DEFAULT_PORTFOLIO,
+                    **options) -> tuple[list[list[int]], bool, str]:
+    """Races several pysat backends on the same Knight's Tour formula, one
+    process each, and returns the first answer, terminating the others.
+
+    The formula is encoded once, and handed to each process. A backend
+    whose process dies without answering counts as failed.
+
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param i0: The start row.
+    @param j0: The start column.
+    @param mode: 'n', 'sc', 'succ' or 'log', see build_knight_tour.
+    @param solver_names: The backends to race.
+    @param options: Other encoding options of build_knight_tour, such as
+        prune or cell_encoding.
+    @return: the solution and whether one exists, as extract_solution, and
+        the name of the backend that answered first.
+    """
+
+    formula = ClauseList()
+    var = encode_knight_tour(formula, M, N, i0, j0, mode, **options)
+
+    results = mp.Queue()
+    workers = [mp.Process(target=portfolio_worker, daemon=True,
+                          args=(name, formula.clauses, M, N, var, [], results))
+               for name in solver_names]
+    for worker in workers:
+        worker.start()
+
+    try:
+        errors = {}
+        while len(errors) < len(workers):
+            try:
+                name, solution, res = results.get(timeout=PORTFOLIO_POLL)
+            except queue.Empty:
+                # A worker killed by its backend, e.g. by a segfault, never
+                # reports: one that exited cleanly has reported already
+                for name, worker in zip(solver_names, workers):
+                    if name not in errors and worker.exitcode not in (None, 0):
+                        errors[name] = f"exited with code {worker.exitcode}"
+                continue
+            if solution is not None:
+                return solution, res, name
+            errors[name] = res
+        raise RuntimeError("Every backend failed: " +
+                           "; ".join(f"{name}: {error}" for name, error in errors.items()))
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+def knight_cubes(M, N, i0, j0, var, k) -> list[list[int]]:
+    """Splits the tours from (i0, j0) into disjoint cubes, one per way of
+    playing the first k moves, given as the literals fixing these moves.
+
+    The paths that get stuck before k moves lead to no tour and get no
+    cube.
+
+    @param var: The VarLayout, LogVars or SuccessorVars of the encoding.
+    @param k: The number of moves fixed by each cube.
+    """
+
+    k = min(k, M * N - 1)
+    successors = isinstance(var, SuccessorVars)
+    paths = []
+
+    def extend(path):
+        if len(path) == k + 1:
+            paths.append(path)
+            return
+        i, j = path[-1]
+        for di, dj in KNIGHT_MOVES:
+            ni, nj = i + di, j + dj
+            if (ni, nj) in path:
+                continue
+            if (('next', i, j, ni, nj) in var if successors
+                    else var.is_kept(ni, nj, len(path))):
+                extend(path + [(ni, nj)])
+
+    extend([(i0, j0)])
+    if successors:
+        return [[var[('next', i, j, ni, nj)] for (i, j), (ni, nj) in zip(path, path[1:])]
+                for path in paths]
+    return [var.path_ids([i * N + j for i, j in path]).tolist() for path in paths]
+
+# State of a cube worker process, set once by cube_worker_init
+cube_worker = {}
+
+def cube_worker_init(name, clauses, M, N, var, stop):
+    """Loads the shared formula in a solver kept by the worker process for
+    all its cubes, and interrupts it as soon as stop is set, if the backend
+    can be interrupted (see solve_cube otherwise)."""
+
+    solver = Solver(name=name, bootstrap_with=clauses)
+    interruptible = supports_interrupt(solver)
+    cube_worker.update(solver=solver, M=M, N=N, var=var, stop=stop,
+                       interruptible=interruptible)
+
+    def interrupt():
+        stop.wait()
+        solver.interrupt()
+    if interruptible:
+        threading.Thread(target=interrupt, daemon=True).start()
+
+def solve_cube(cube):
+    """Looks for a tour in the cube, setting stop when one is found.
+
+    A backend that cannot be interrupted, such as CaDiCaL, searches in
+    slices of CUBE_SLICE_CONFLICTS conflicts instead, stop being checked
+    between two slices.
+
+    @return: the solution, False if the cube has no tour, None if the
+        search was stopped.
+    """
+
+    solver, M, N, var, stop, interruptible = (
+        cube_worker[key] for key in ('solver', 'M', 'N', 'var', 'stop', 'interruptible'))
+    while not stop.is_set():
+        if not interruptible:
+            solver.conf_budget(CUBE_SLICE_CONFLICTS)
+        res = solver.solve_limited(assumptions=cube, expect_interrupt=interruptible)
+        if res is None:
+            if interruptible:
+                return None
+            continue  # Out of the slice
+        if not res:
+            return False
+        model = solver.get_model()
+        if isinstance(var, SuccessorVars):
+            successors = model_to_successors(model, var)
+            solution, cycles = successors_to_solution(successors, M, N, var.start)
+            if cycles:
+                add_subtour_elimination_constraints(solver, M, N, var, cycles)
+                continue
+        else:
+            solution = model_to_solution(model, M, N, var)
+        stop.set()
+        return solution
+    return None
+
+def count_cube(cube) -> int:
+    """Counts the tours of the cube.
+
+    The blocking clauses of the enumeration stay in the worker solver, but
+    each of them only excludes a tour of this cube.
+    """
+
+    w = cube_worker
+    return count_solutions(w['solver'], w['M'], w['N'], w['var'], cube)
+
+def enumerate_cube(cube) -> list:
+    """Lists the tours of the cube, see count_cube."""
+
+    w = cube_worker
+    return list(iter_solutions(w['solver'], w['M'], w['N'], w['var'], cube))
+
+def cube_and_conquer(M, N, i0, j0, mode='sc', task='solve', k=3, processes=None,
+                     solver_name='glucose3', **options):
+    """Solves the Knight's Tour from (i0, j0) on several cores, splitting it
+    into disjoint cubes that fix the first k moves (see knight_cubes).
+
+    The formula is encoded once and each worker of the process pool loads
+    it in one solver, which then solves its cubes under assumptions.
+
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param i0: The start row.
+    @param j0: The start column.
+    @param mode: 'n', 'sc', 'succ' or 'log', see build_knight_tour.
+    @param task: 'solve' to find one tour, stopping every worker as soon as
+        one is found, 'count' to count the tours, or 'all' to list them.
+    @param k: The number of moves fixed by each cube, the cubes being at
+        most 8^k.
+    @param processes: The number of workers, by default the number of cores.
+    @param solver_name: The pysat backend, see build_knight_tour.
+    @param options: Other encoding options of build_knight_tour.
+    @return: for 'solve', the solution and whether one exists, as
+        extract_solution; for 'count', the number of tours; for 'all', the
+        list of the tours and whether there is one, as extract_all_solutions.
+    """
+
+    tasks = {'solve': solve_cube, 'count': count_cube, 'all': enumerate_cube}
+    if task not in tasks:
+        raise ValueError(f"Unknown task {task!r}, expected one of {sorted(tasks)}")
+    check_incremental(solver_name)
+
+    formula = ClauseList()
+    var = encode_knight_tour(formula, M, N, i0, j0, mode, **options)
+    cubes = knight_cubes(M, N, i0, j0, var, k)
+    stop = mp.Event()
+
+    with ProcessPoolExecutor(processes, initializer=cube_worker_init,
+                             initargs=(solver_name, formula.clauses, M, N, var, stop)
+                             ) as executor:
+        futures = [executor.submit(tasks[task], cube) for cube in cubes]
+        try:
+            if task == 'solve':
+                for future in as_completed(futures):
+                    solution = future.result()
+                    if solution:
+                        return solution, True
+                return [[-1] * N for _ in range(M)], False
+            if task == 'count':
+                return sum(future.result() for future in futures)
+            solutions = [solution for future in futures for solution in future.result()]
+            return solutions, len(solutions) > 0
+        finally:
+            stop.set()
+            executor.shutdown(cancel_futures=True)
@@ -96,7 +96,8 @@ def rainbow_plot(solution, name="rainbow") -> None:
 def rainbow_plot_all(solutions, name):
     """ This function plots all solutions using a colormap.
 
-    @param solution: A list of solutions. The solutions to display.
+    @param solution: A list of solutions, or the StoredSolutions of a
+        SolutionStore, read one solution at a time. The solutions to display.
     @param name: the name of the file to save. 
     """
 
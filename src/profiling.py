@@ -0,0 +1,104 @@
+import json
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from helpers import SuccessorVars, LogVars
+
+try:
+    import resource
+except ImportError:  # Not on Windows
+    resource = None
+
+# Names of the auxiliary variable families, as the clause families
+AUX_FAMILIES = {'aux_1': 'cell', 'aux_2': 'time'}
+
+def peak_memory_kb() -> int | None:
+    """The peak resident memory of the process so far, solvers included,
+    in KiB, or None where it cannot be read."""
+
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def variable_families(var) -> dict:
+    """The number of variables of each family of an encoding: the position
+    variables, then the auxiliary ones."""
+
+    if isinstance(var, SuccessorVars):
+        return {'moves': len(var), 'selectors': len(var.selectors)}
+    if isinstance(var, LogVars):
+        families = {'positions': var.T * var.bits}
+    else:
+        families = {'positions': len(var) - sum(stop - start for start, stop
+                                                in var.aux.values())}
+    for name, (start, stop) in var.aux.items():
+        name = 'symmetry' if name.startswith('sym_') else AUX_FAMILIES.get(name, name)
+        families[name] = families.get(name, 0) + stop - start
+    return families
+
+class Profile:
+    """Instrumentation of the build and the solves of a Knight's Tour
+    problem, given as profile to build_knight_tour, extract_solution and
+    extract_all_solutions, which fill its record:
+
+    - phases: the wall time of each phase in seconds, summed over the
+      calls: 'warnsdorff', 'encode', 'transfer' (the clauses to the
+      solver), 'search' and 'decode';
+    - clauses and variables: their number per constraint family, e.g.
+      'cell', 'time' and 'legal_moves' (only the total of the clauses when
+      the formula comes from the CNF cache);
+    - stats: the accum_stats of the solver after the last solve, such as
+      conflicts, decisions and propagations;
+    - peak_memory_kb: the peak memory of the process at the end of the
+      last phase, which covers every earlier run of the process too;
+    - the parameters of the build, and the result of the last solve.
+    """
+
+    def __init__(self, **labels):
+        """@param labels: Extra entries of the record, e.g. a run name."""
+
+        self.record = dict(labels, phases={}, clauses={}, variables={}, stats={},
+                           peak_memory_kb=None)
+
+    @contextmanager
+    def phase(self, name):
+        """Times the code of a with block as the phase name."""
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            phases = self.record['phases']
+            phases[name] = phases.get(name, 0.0) + perf_counter() - start
+            self.record['peak_memory_kb'] = peak_memory_kb()
+
+    def add_time(self, name, seconds):
+        """Adds seconds to the phase name, e.g. to move the time of a
+        phase nested in another one out of it."""
+
+        phases = self.record['phases']
+        phases[name] = phases.get(name, 0.0) + seconds
+
+    def count_formula(self, families, var):
+        """Records the clauses per family, and the variables of var."""
+
+        self.record['clauses'] = {str(name): n for name, n in families.items()}
+        self.record['variables'] = variable_families(var)
+
+    def solver_stats(self, solver):
+        """Records the statistics of the solver, if it has any."""
+
+        try:
+            self.record['stats'] = dict(solver.accum_stats() or {})
+        except NotImplementedError:
+            pass
+
+    def write(self, path):
+        """Appends the record to a JSON lines file."""
+
+        with open(path, 'a') as f:
+            f.write(json.dumps(self.record) + '\n')
+
+def profiled(profile, name):
+    """profile.phase(name), or a context doing nothing without profile."""
+
+    return nullcontext() if profile is None else profile.phase(name)
@@ -1,5 +1,5 @@
 from knight_tour import *
-from symmetry import count_up_to_symmetry
+from symmetry import start_orbits
 
 def question1(M, N, i0, j0):
     solver, variables = build_knight_tour(M, N, i0, j0)
@@ -11,12 +11,13 @@ def question3():
     M = 3
     N = 4
 
+    # A single encoding, the start square is given as an assumption
+    solver, variables = build_knight_board(M, N)
     nb_sol = 0
     for i0 in range(M):
         for j0 in range(N):
-            solver, variables = build_knight_tour(M, N, i0, j0)
-            solutions, _ = extract_all_solutions(solver, M, N, variables)
-            nb_sol += len(solutions)
+            start = variables.start_assumptions(i0, j0)
+            nb_sol += count_solutions(solver, M, N, variables, start)
 
     return nb_sol
 
@@ -25,11 +26,11 @@ def question4():
     N = 4
     
     nb_sol = 0
-    for i0 in range(M):
-        for j0 in range(N):
-            solver, variables = build_knight_tour(M, N, i0, j0, 'sc')
-            solutions, _ = extract_all_solutions(solver, M, N, variables)
-            nb_sol += count_up_to_symmetry(solutions, M, N)
+    # Symmetric start squares have as many tours: solve one per orbit
+    for (i0, j0), orbit_size in start_orbits(M, N).items():
+        solver, variables = build_knight_tour(M, N, i0, j0, 'sc',
+                                              symmetry_breaking=True)
+        nb_sol += orbit_size * count_solutions(solver, M, N, variables)
     
     return nb_sol
 
@@ -0,0 +1,235 @@
+from functools import lru_cache
+import numpy as np
+from constraints import KNIGHT_MOVES
+from knight_tour import build_knight_tour, extract_solution
+from warnsdorff import is_knight_tour, path_to_solution
+
+def even_parts(length: int) -> list[int]:
+    """Splits an even length, 0 or at least 6, into even parts between 6
+    and 10."""
+
+    parts = []
+    while length > 10:
+        parts.append(6)
+        length -= 6
+    if length:
+        parts.append(length)
+    return parts
+
+def split_side(length: int, at: int = 0) -> list[int]:
+    """Splits a side of the board into block sides between 5 and 10, all
+    even but one when length is odd: the side of the blocks holding the
+    cell at, which takes 11 cells for the middle cell of a side of 11.
+
+    Every h x w board with 5 <= h, w and h * w even has a closed tour.
+    """
+
+    if length < 5:
+        raise ValueError(f"A side of {length} cells is too short to stitch")
+    if length % 2 == 0:
+        return even_parts(length)
+    for odd in (5, 7, 9, 11):
+        # The even part before the odd one, which must hold at
+        for before in range(at - at % 2, at - odd, -2):
+            after = length - before - odd
+            if before >= 0 and after >= 0 and before not in (2, 4) and after not in (2, 4):
+                return even_parts(before) + [odd] + even_parts(after)
+    raise ValueError(f"A side of {length} cells cannot be split around {at}")
+
+@lru_cache(maxsize=None)
+def base_cycle(h: int, w: int) -> tuple[int, ...]:
+    """A closed tour of an h x w board, found by the SAT solver and kept
+    for the next calls.
+
+    @return: the cell indices i * w + j of the tour, from (0, 0).
+    """
+
+    solver, vars = build_knight_tour(h, w, 0, 0, 'sc', closed=True)
+    solution, res = extract_solution(solver, h, w, vars)
+    solver.delete()
+    if not res:
+        raise ValueError(f"A {h}x{w} board has no closed tour")
+    return tuple(np.argsort(np.asarray(solution).ravel()).tolist())
+
+@lru_cache(maxsize=None)
+def base_path(h: int, w: int, i0: int, j0: int) -> tuple[int, ...]:
+    """An open tour of an h x w board from (i0, j0), found by the SAT
+    solver and kept for the next calls.
+
+    @return: the cell indices i * w + j of the tour.
+    """
+
+    solver, vars = build_knight_tour(h, w, i0, j0, 'sc', warnsdorff=True)
+    solution, res = extract_solution(solver, h, w, vars)
+    solver.delete()
+    if not res:
+        raise ValueError(f"A {h}x{w} board has no tour from ({i0}, {j0})")
+    return tuple(np.argsort(np.asarray(solution).ravel()).tolist())
+
+def knight_adjacent(a: int, b: int, N: int) -> bool:
+    """Tells whether the cells of indices a and b are a knight move apart."""
+
+    di, dj = abs(a // N - b // N), abs(a % N - b % N)
+    return (di, dj) in ((1, 2), (2, 1))
+
+def join_block(succ, pred, M, N, merged, block) -> None:
+    """Merges the cycle of a block into the cycle of the merged cells.
+
+    An edge a1 -> a2 of the merged cycle and an edge b1 -> b2 of the block
+    cycle are replaced by a1 -> b2 and b1 -> a2, which takes one knight
+    move each way across the border of the block. The block cycle is
+    reversed first when only a1 - b1 and a2 - b2 are knight moves.
+
+    One of the cycles may be an open path instead, whose ends have no
+    next or previous cell: the result is then an open path too.
+
+    @param succ: The next cell of each cell, along its cycle, -1 at the
+        end of a path.
+    @param pred: The previous cell of each cell, -1 at the start of a path.
+    @param merged: Whether each cell is in the merged cycle.
+    @param block: (r0, c0, h, w), the block rows r0..r0+h-1 and columns
+        c0..c0+w-1.
+    """
+
+    r0, c0, h, w = block
+    cells = ((np.arange(r0, r0 + h) * N)[:, None] + np.arange(c0, c0 + w)).ravel()
+
+    # The merged cells a knight move away from the block are 2 cells away
+    # at most
+    for i in range(max(r0 - 2, 0), min(r0 + h + 2, M)):
+        for j in range(max(c0 - 2, 0), min(c0 + w + 2, N)):
+            a1 = i * N + j
+            if not merged[a1]:
+                continue
+            a2 = succ[a1]
+            if a2 < 0:
+                continue
+            for di, dj in KNIGHT_MOVES:
+                bi, bj = i + di, j + dj
+                if not (r0 <= bi < r0 + h and c0 <= bj < c0 + w):
+                    continue
+                b2 = bi * N + bj
+                if pred[b2] >= 0 and knight_adjacent(pred[b2], a2, N):
+                    pass
+                elif succ[b2] >= 0 and knight_adjacent(succ[b2], a2, N):
+                    succ[cells], pred[cells] = pred[cells].copy(), succ[cells].copy()
+                else:
+                    continue
+                b1 = pred[b2]
+                succ[a1], pred[b2] = b2, a1
+                succ[b1], pred[a2] = a2, b1
+                merged[cells] = True
+                return
+
+    raise RuntimeError(f"The block {block} could not be joined")
+
+def stitch_blocks(M: int, N: int, rows, cols, start=None) -> np.ndarray:
+    """Merges the base tours of the blocks of a board one by one in
+    row-major order, each into the tour of the blocks before it, see
+    join_block.
+
+    @param rows: The heights of the rows of blocks, see split_side.
+    @param cols: The widths of the columns of blocks.
+    @param start: (i0, j0) to give the block holding it an open base path
+        from (i0, j0) instead of a closed tour, None for none.
+    @return: the next cell of each cell index i * N + j, -1 at the end of
+        the tour if it is open.
+    """
+
+    succ = np.empty(M * N, dtype=np.int64)
+    pred = np.empty(M * N, dtype=np.int64)
+    merged = np.zeros(M * N, dtype=bool)
+
+    r0 = 0
+    for h in rows:
+        c0 = 0
+        for w in cols:
+            # Move the base tour to the block
+            opened = start is not None and r0 <= start[0] < r0 + h and c0 <= start[1] < c0 + w
+            if opened:
+                local = np.asarray(base_path(h, w, start[0] - r0, start[1] - c0))
+            else:
+                local = np.asarray(base_cycle(h, w))
+            cells = (r0 + local // w) * N + c0 + local % w
+            succ[cells] = np.roll(cells, -1)
+            pred[cells] = np.roll(cells, 1)
+            if opened:
+                succ[cells[-1]], pred[cells[0]] = -1, -1
+            if r0 == 0 and c0 == 0:
+                merged[cells] = True
+            else:
+                join_block(succ, pred, M, N, merged, (r0, c0, h, w))
+            c0 += w
+        r0 += h
+
+    return succ
+
+def stitched_cycle(M: int, N: int) -> np.ndarray:
+    """Builds a closed tour of an M x N board from the closed tours of
+    blocks between 5x5 and 10x10, in time linear in M * N.
+
+    @return: the next cell of each cell index i * N + j along the tour.
+    """
+
+    if M % 2 == 1 and N % 2 == 1:
+        raise ValueError(f"A {M}x{N} board has an odd number of cells and no "
+                         "closed tour, see stitched_path")
+    return stitch_blocks(M, N, split_side(M), split_side(N))
+
+def stitched_path(M: int, N: int, i0: int, j0: int) -> np.ndarray:
+    """Builds an open tour from (i0, j0) of an M x N board with M and N
+    odd, in time linear in M * N.
+
+    The sides are split so that the only odd block holds (i0, j0), this
+    block taking an open base tour from it and the others their closed
+    tours, see stitch_blocks.
+
+    @return: the cell indices i * N + j of the tour.
+    """
+
+    if (i0 + j0) % 2 == 1:
+        raise ValueError(f"A {M}x{N} board has no tour from ({i0}, {j0}): "
+                         "it is of the minority colour")
+    succ = stitch_blocks(M, N, split_side(M, i0), split_side(N, j0), (i0, j0))
+
+    c = i0 * N + j0
+    if succ[c] < 0:
+        # The base path of the start block was reversed: the tour ends on
+        # (i0, j0), and starts on the cell next to none
+        c = int(np.setdiff1d(np.arange(M * N), succ)[0])
+    path = np.empty(M * N, dtype=np.int64)
+    for t in range(M * N):
+        path[t] = c
+        c = succ[c]
+    return path if path[0] == i0 * N + j0 else path[::-1]
+
+def stitched_tour(M: int, N: int, i0: int = 0, j0: int = 0) -> list[list[int]]:
+    """A knight's tour of an M x N board from (i0, j0), for boards far too
+    large for the SAT encodings, such as 100x100 or 500x500.
+
+    The tour is the closed tour of stitched_cycle, started on (i0, j0): it
+    also ends a knight move away from it. When M and N are both odd, there
+    is no closed tour: the tour is the open one of stitched_path, which
+    only exists when (i0, j0) has the colour of the corners.
+
+    @param M: The number of rows in the chessboard, at least 5.
+    @param N: The number of columns in the chessboard, at least 5.
+    @param i0: The start row.
+    @param j0: The start column.
+    @return: the solution matrix, holding the timestep at which each cell
+        is visited, as extract_solution.
+    """
+
+    if M % 2 == 1 and N % 2 == 1:
+        path = stitched_path(M, N, i0, j0)
+    else:
+        succ = stitched_cycle(M, N)
+        path = np.empty(M * N, dtype=np.int64)
+        c = i0 * N + j0
+        for t in range(M * N):
+            path[t] = c
+            c = succ[c]
+
+    if not is_knight_tour(path, M, N, i0, j0):
+        raise RuntimeError(f"The stitched {M}x{N} tour is broken")
+    return path_to_solution(path, M, N)
@@ -0,0 +1,144 @@
+import os
+import numpy as np
+
+# File header: magic, then M and N as uint32
+MAGIC = b'KTSTORE1'
+HEADER_SIZE = len(MAGIC) + 8
+
+def path_dtype(T: int) -> np.dtype:
+    """The smallest unsigned type holding the cell indices of T cells."""
+
+    if T <= 1 << 8:
+        return np.dtype(np.uint8)
+    if T <= 1 << 16:
+        return np.dtype(np.uint16)
+    return np.dtype(np.uint32)
+
+def solution_to_path(solution) -> np.ndarray:
+    """The cell indices i * N + j of a tour in visiting order, from its
+    solution matrix."""
+
+    return np.argsort(np.asarray(solution).ravel(), kind='stable')
+
+class SolutionStore:
+    """An append-only file of tours, each one packed as its T cell indices
+    in visiting order, on one or two bytes per step up to 256 and 65536
+    cells.
+
+    The tours are read back lazily from a memory map of the file (see
+    paths and solutions), so that enumerations much larger than the memory
+    can be kept and processed. A store can be reopened to append more tours
+    to it.
+    """
+
+    def __init__(self, path, M=None, N=None, dedup=False):
+        """Opens the store at path, creating it for M x N boards if needed.
+
+        @param dedup: Whether to skip the tours already in the store, with
+            an index of the packed tours kept in memory.
+        """
+
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            with open(path, 'rb') as f:
+                header = f.read(HEADER_SIZE)
+            if header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a solution store")
+            stored = tuple(np.frombuffer(header[len(MAGIC):], dtype=np.uint32).tolist())
+            if M is not None and (M, N) != stored:
+                raise ValueError(f"{path} holds {stored[0]}x{stored[1]} tours, not {M}x{N}")
+            M, N = stored
+            self.file = open(path, 'ab')
+        else:
+            if M is None:
+                raise ValueError("The board size is needed to create a store")
+            self.file = open(path, 'wb')
+            self.file.write(MAGIC + np.array([M, N], dtype=np.uint32).tobytes())
+            self.file.flush()
+
+        self.M, self.N, self.T = M, N, M * N
+        self.dtype = path_dtype(self.T)
+        self.count = 0
+        if self.T:
+            self.count = (os.path.getsize(path) - HEADER_SIZE) // self.record_size()
+        self.index = None
+        if dedup:
+            self.index = {row.tobytes() for row in self.paths()}
+
+    def record_size(self) -> int:
+        return self.T * self.dtype.itemsize
+
+    def add_path(self, path) -> bool:
+        """Appends a tour given as cell indices in visiting order.
+
+        @return: whether it was added, i.e. not already there with dedup.
+        """
+
+        record = np.asarray(path, dtype=self.dtype).tobytes()
+        if self.index is not None:
+            if record in self.index:
+                return False
+            self.index.add(record)
+        self.file.write(record)
+        self.count += 1
+        return True
+
+    def add(self, solution) -> bool:
+        """Appends a tour given as a solution matrix, see add_path."""
+
+        return self.add_path(solution_to_path(solution))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def paths(self) -> np.ndarray:
+        """The tours as a read-only (K, T) memory map of cell indices."""
+
+        if not self.file.closed:
+            self.flush()
+        if self.count == 0:
+            return np.empty((0, self.T), dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode='r',
+                         offset=HEADER_SIZE, shape=(self.count, self.T))
+
+    def solutions(self) -> 'StoredSolutions':
+        """The tours as solution matrices, decoded on access."""
+
+        return StoredSolutions(self.paths(), self.M, self.N)
+
+class StoredSolutions:
+    """A read-only sequence of solution matrices decoded on access from the
+    packed tours of a SolutionStore. Indexing with a slice gives a (K, M, N)
+    array, so that consumers such as count_up_to_symmetry can work chunk
+    by chunk."""
+
+    def __init__(self, paths, M, N):
+        self.paths, self.M, self.N = paths, M, N
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, key) -> np.ndarray:
+        paths = np.asarray(self.paths[key], dtype=np.int64)
+        single = paths.ndim == 1
+        paths = paths.reshape(-1, self.M * self.N)
+        times = np.empty_like(paths)
+        np.put_along_axis(times, paths, np.arange(self.M * self.N), axis=1)
+        times = times.reshape(-1, self.M, self.N)
+        return times[0] if single else times
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
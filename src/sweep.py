@@ -0,0 +1,162 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import time
+from knight_tour import build_knight_tour, extract_solution, count_solutions
+from budget import Budget
+from symmetry import start_orbits
+
+def boards_up_to(size: int) -> list[tuple[int, int]]:
+    """The boards M x N with 1 <= M <= N <= size, N x M having as many
+    tours as M x N."""
+
+    return [(m, n) for m in range(1, size + 1) for n in range(m, size + 1)]
+
+def grid_jobs(boards, modes=('sc',), starts='all', task='solve',
+              timeout=None) -> list[dict]:
+    """Lists the jobs of a sweep, one per board, start square and mode.
+
+    @param boards: The (M, N) boards to sweep.
+    @param modes: The modes to build each board with, see build_knight_tour.
+    @param starts: 'all' for every start square, or 'orbits' for one start
+        square per orbit under the board symmetries (see start_orbits).
+    @param task: 'solve' to look for one tour, 'count' to count them.
+    @param timeout: The time limit of each job in seconds, None for none.
+    @return: the jobs, as dicts with keys M, N, i0, j0, mode, task,
+        timeout and weight, the number of start squares the job stands for.
+    """
+
+    jobs = []
+    for M, N in boards:
+        if starts == 'orbits':
+            squares = start_orbits(M, N)
+        else:
+            squares = {(i0, j0): 1 for i0 in range(M) for j0 in range(N)}
+        for mode in modes:
+            for (i0, j0), weight in squares.items():
+                jobs.append({'M': M, 'N': N, 'i0': i0, 'j0': j0, 'mode': mode,
+                             'task': task, 'timeout': timeout, 'weight': weight})
+    return jobs
+
+def job_key(job) -> tuple:
+    """What identifies a job in the output of a sweep."""
+
+    return tuple(job[key] for key in ('M', 'N', 'i0', 'j0', 'mode', 'task'))
+
+def run_job(job) -> dict:
+    """Runs one job of a sweep.
+
+    @return: the job with its results: res, whether there is a tour, None
+        if the job timed out, the solution found or count, the number of
+        tours (found before the timeout), and time, the time it took to
+        build and solve.
+    """
+
+    M, N, i0, j0, mode = job['M'], job['N'], job['i0'], job['j0'], job['mode']
+    start = time()
+    budget = Budget(timeout=job['timeout']) if job.get('timeout') else None
+    solver, vars = build_knight_tour(M, N, i0, j0, mode)
+    record = dict(job)
+    if job['task'] == 'count':
+        record['count'] = count_solutions(solver, M, N, vars, budget=budget)
+        record['res'] = None if budget and budget.exhausted else record['count'] > 0
+    else:
+        solution, record['res'] = extract_solution(solver, M, N, vars, budget=budget)
+        record['solution'] = solution if record['res'] else None
+    solver.delete()
+    record['time'] = time() - start
+    return record
+
+def read_sweep(path) -> list[dict]:
+    """Reads the records of a sweep output, one JSON object per line. A
+    last line cut short by a killed sweep is ignored."""
+
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+def run_sweep(jobs, output, processes=None, backend='process'):
+    """Runs the jobs of a sweep in parallel, appending each record to output
+    as a JSON line as soon as it is done.
+
+    The jobs already recorded in output are skipped, so that a killed sweep
+    resumes where it stopped when run again.
+
+    @param jobs: The jobs, see grid_jobs.
+    @param output: The path of the JSON lines file.
+    @param processes: The number of workers, by default the number of cores.
+    @param backend: 'process' for a local process pool, or 'dask' for a
+        local dask.distributed cluster.
+    @return: all the records of the sweep, former ones included.
+    """
+
+    records = read_sweep(output)
+    done = {job_key(record) for record in records}
+    todo = [job for job in jobs if job_key(job) not in done]
+
+    # Rewrite the complete records, dropping a line cut short, under a
+    # temporary name first: a sweep killed meanwhile loses nothing
+    tmp = f'{output}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    os.replace(tmp, output)
+
+    with open(output, 'a') as f:
+        for record in run_jobs(todo, processes, backend):
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            records.append(record)
+
+    return records
+
+def run_jobs(jobs, processes=None, backend='process'):
+    """Yields the records of the jobs, in the order they finish."""
+
+    if not jobs:
+        return
+
+    if backend == 'dask':
+        try:
+            from dask.distributed import Client, LocalCluster, as_completed as dask_completed
+        except ImportError:
+            raise ImportError("The 'dask' backend needs dask.distributed, "
+                              "e.g. pip install 'dask[distributed]'")
+        with LocalCluster(n_workers=processes, threads_per_worker=1) as cluster, \
+                Client(cluster) as client:
+            for future in dask_completed(client.map(run_job, jobs, pure=False)):
+                yield future.result()
+        return
+
+    if backend != 'process':
+        raise ValueError(f"Unknown backend {backend!r}, expected 'process' or 'dask'")
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+def sweep_summary(records) -> dict:
+    """Sums up a sweep per board and mode.
+
+    @return: a dict (M, N, mode) -> {'starts': number of start squares with
+        a tour, 'unknown': number of start squares whose job timed out,
+        'tours': total count when counted, 'time': total time}.
+    """
+
+    summary = {}
+    for record in records:
+        key = (record['M'], record['N'], record['mode'])
+        entry = summary.setdefault(key, {'starts': 0, 'unknown': 0, 'tours': 0,
+                                         'time': 0.0})
+        entry['starts'] += record['weight'] * bool(record['res'])
+        entry['unknown'] += record['weight'] * (record['res'] is None)
+        entry['tours'] += record['weight'] * record.get('count', 0)
+        entry['time'] += record['time']
+    return summary
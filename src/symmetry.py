@@ -1,4 +1,8 @@
+from itertools import combinations
+import numpy as np
 from plot import rainbow_plot
+from constraints import KNIGHT_MOVES
+from helpers import valid_pos, SuccessorVars
 
 def vertical_symmetry(solution, M, N) -> list[list[int]]:
     """Apply vertical axial symmetry: (i, j) -> (i, N-1-j)."""
@@ -27,35 +31,176 @@ def central_symmetry(solution, M, N) -> list[list[int]]:
             new_solution[M - 1 - i][N - 1 - j] = solution[i][j]
     return new_solution
 
+def board_symmetries(M, N) -> list[np.ndarray]:
+    """The symmetries of an M x N board, as permutations of the cell
+    indices i * N + j: perm[c] is the image of cell c.
+
+    The identity comes first, then the vertical, horizontal and central
+    symmetries. Square boards also have the two diagonal symmetries and
+    the two quarter-turn rotations.
+    """
+
+    i, j = np.divmod(np.arange(M * N), N)
+    maps = [(i, j), (i, N - 1 - j), (M - 1 - i, j), (M - 1 - i, N - 1 - j)]
+    if M == N:
+        maps += [(j, i), (N - 1 - j, M - 1 - i), (j, M - 1 - i), (N - 1 - j, i)]
+    return [a * N + b for a, b in maps]
+
+def canonical_forms(solutions, M, N) -> list[bytes]:
+    """Reduces each solution to a canonical key: the smallest of its images
+    under the board symmetries. Two solutions are equivalent iff their
+    keys are equal."""
+
+    if len(solutions) == 0:
+        return []
+
+    flat = np.asarray(solutions, dtype=np.int64).reshape(-1, M * N)
+    perms = board_symmetries(M, N)
+    images = np.empty((len(flat), len(perms), M * N), dtype=np.int64)
+    for g, perm in enumerate(perms):
+        images[:, g, perm] = flat
+    return [min(image.tobytes() for image in group) for group in images]
+
 def are_equivalent(solution1, solution2, M, N) -> bool:
     """Checks if solution1 is equivalent to solution2 using any symmetry."""
 
-    if solution1 == solution2:
-        return True
-    if vertical_symmetry(solution2, M, N) == solution1:
-        return True
-    if horizontal_symmetry(solution2, M, N) == solution1:
-        return True
-    if central_symmetry(solution2, M, N) == solution1:
-        return True
-    return False
-
-def count_up_to_symmetry(solutions, M, N) -> int:
-    """Counts the number of distinct solutions up to symmetry."""
-    
-    if not solutions:
-        return 0
-
-    groups = []
-    for sol in solutions:
-        # Check if sol belongs to an existing group
-        found = False
-        for group in groups:
-            if are_equivalent(sol, group[0], M, N):
-                group.append(sol)
-                found = True
+    key1, key2 = canonical_forms([solution1, solution2], M, N)
+    return key1 == key2
+
+def symmetry_classes(solutions, M, N, chunk_size=10000) -> dict:
+    """Groups the solutions by symmetry class with one hash lookup each.
+
+    The solutions are handled chunk_size at a time, so that they can be
+    read lazily, e.g. from a SolutionStore.
+
+    @return: a dict canonical key -> number of solutions in the class, that
+        is the size of its orbit among the given solutions.
+    """
+
+    classes = {}
+    for first in range(0, len(solutions), chunk_size):
+        for key in canonical_forms(solutions[first:first + chunk_size], M, N):
+            classes[key] = classes.get(key, 0) + 1
+    return classes
+
+def count_up_to_symmetry(solutions, M, N, with_orbits=False):
+    """Counts the number of distinct solutions up to symmetry.
+
+    @param solutions: A list of solutions, or the StoredSolutions of a
+        SolutionStore.
+
+    @param with_orbits: Also return the orbit size of each class, as a
+        list sorted in decreasing order.
+    """
+
+    classes = symmetry_classes(solutions, M, N)
+    if with_orbits:
+        return len(classes), sorted(classes.values(), reverse=True)
+    return len(classes)
+
+def start_orbits(M, N) -> dict:
+    """Groups the start squares that are images of each other by a board
+    symmetry: their tours are in bijection.
+
+    @return: a dict (i0, j0) -> orbit size, with one start square per orbit.
+    """
+
+    perms = board_symmetries(M, N)
+    orbits = {}
+    for c in range(M * N):
+        images = {int(perm[c]) for perm in perms}
+        if c == min(images):
+            orbits[divmod(c, N)] = len(images)
+    return orbits
+
+def add_symmetry_breaking_constraints(solver, M, N, i0, j0, var, var_id):
+    """Adds lex-leader constraints keeping a single tour per symmetry class.
+
+    Two tours from (i0, j0) are equivalent through the symmetries g that
+    leave (i0, j0) in place. Writing a tour as the sequence of its cell
+    indices c_0, c_1, ..., only the tour smaller than or equal to its image
+    g(c_0), g(c_1), ... in lexicographic order is kept, for every such g.
+
+    For each g, aux e_t is true while the tour and its image are equal up
+    to timestep t. While they are equal, c_t <= g(c_t) must hold: the cells
+    p with g(p) < p are forbidden, and staying on a fixed point of g keeps
+    them equal.
+
+    @param solver: The solver instance to add constraints to.
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param i0: The start row.
+    @param j0: The start column.
+    @param var: A VarLayout of all the variables.
+    @param var_id: The next free variable id.
+    """
+
+    T = M * N
+    ids = var.position_ids().reshape(T, T)
+    cells = np.arange(T)
+    start = i0 * N + j0
+
+    for g, perm in enumerate(board_symmetries(M, N)[1:], start=1):
+        if perm[start] != start:
+            continue
+        smaller = cells[perm < cells]
+        fixed = cells[perm == cells]
+        first = var_id
+
+        equal = []  # e_{t-1}, empty while it is always true (t = 1)
+        for t in range(1, T):
+            lits = ids[t, smaller]
+            solver.append_formula([equal + [-lit] for lit in lits[lits != 0].tolist()])
+            if t == T - 1:
                 break
-        if not found:
-            groups.append([sol])
-    
-    return len(groups)
\ No newline at end of file
+            lits = ids[t, fixed]
+            solver.append_formula([equal + [-lit, var_id]
+                                   for lit in lits[lits != 0].tolist()])
+            equal = [-var_id]
+            var_id += 1
+
+        var.add_aux(f'sym_{g}', first, var_id)
+
+    return solver, var, var_id
+
+def add_reversal_breaking_constraints(solver, M, N, i0, j0, var):
+    """Keeps one of each closed tour and its reversal.
+
+    A closed tour c_0, c_1, ..., c_{T-1} from the start and its reversal
+    c_0, c_{T-1}, ..., c_1 first differ at timestep 1, so the lex-leader
+    constraint of the reversal (see add_symmetry_breaking_constraints) only
+    keeps the tours with c_1 < c_{T-1}. In the successor encoding, c_1 and
+    c_{T-1} are the cells the start jumps to and is entered from.
+
+    @param solver: The solver instance to add constraints to.
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param i0: The start row, or None when the start is left to the
+        assumptions. A closed successor encoding then uses (0, 0): its
+        cycles do not depend on the start.
+    @param j0: The start column.
+    @param var: A VarLayout or a SuccessorVars of all the variables.
+    """
+
+    T = M * N
+    successors = isinstance(var, SuccessorVars)
+    if i0 is not None or successors:
+        starts = [(0, 0) if i0 is None else (i0, j0)]
+    else:
+        starts = [(i, j) for i in range(M) for j in range(N)]
+
+    for i, j in starts:
+        guard = [] if i0 is not None or successors else [-var.pos(i, j, 0)]
+        # Sorted by cell index
+        neighbours = sorted((i + di, j + dj) for di, dj in KNIGHT_MOVES
+                            if valid_pos(i + di, j + dj, M, N))
+        for a, b in combinations(neighbours, 2):
+            # Forbid c_1 = b > a = c_{T-1}
+            if successors:
+                keys = [('next', i, j, *b), ('next', *a, i, j)]
+            else:
+                keys = [(*b, 1), (*a, T - 1)]
+            if all(key in var for key in keys):
+                solver.add_clause(guard + [-var[key] for key in keys])
+
+    return solver, var
@@ -2,25 +2,32 @@ from time import time
 import os
 import solution_template as st
 from knight_tour import *
+from counting import count_tours
+from stitching import stitched_tour
+from budget import Budget
+from profiling import Profile
+from verify import check_tours
+from sweep import run_sweep, grid_jobs, boards_up_to, sweep_summary
 from helpers import *
 from plot import *
 from pathlib import Path
 
 def timing_test_script() -> None:
-    """ This script compares timing between many efficient and naive solutions."""
+    """ This script compares timing between many efficient and naive solutions,
+    phase by phase (see Profile)."""
 
-    def chrono(M: int, N: int, i0: int, j0: int, mode: str) -> tuple[float, float, bool]:
+    def chrono(M: int, N: int, i0: int, j0: int, mode: str) -> tuple[dict, bool]:
         """Tests the time it takes to find a solution.
         
-        Returns the start and end time and whether a solution was found.
+        Returns the time of each phase and whether a solution was found.
         """
 
-        start = time()
-        solver, vars = build_knight_tour(M, N, i0, j0, mode)
-        _, res = extract_solution(solver, M, N, vars)
-        end = time()
+        profile = Profile()
+        solver, vars = build_knight_tour(M, N, i0, j0, mode, profile=profile)
+        _, res = extract_solution(solver, M, N, vars, profile=profile)
+        solver.delete()
 
-        return start, end, res
+        return profile.record['phases'], res
 
     M = N = range(0, 7)
 
@@ -29,16 +36,126 @@ def timing_test_script() -> None:
             if m <= n:  # avoid to repeat MxN and NxM solutions
                 for i0 in range(m):
                     for j0 in range(n):
-                        
-                        start_n, end_n, res_n = chrono(m, n, i0, j0, 'n')
-                        start_sc, end_sc, res_sc = chrono(m, n, i0, j0, 'sc')
-                        
-                        time_sc = end_sc - start_sc
-                        time_n = end_n - start_n
-                        
+
                         print(f"Test {m}x{n}@({i0},{j0})")
-                        print(f"  sc: {time_sc:.3}, {res_sc}")
-                        print(f"  n : {time_n:.3}, {res_n}")
+                        for mode in ['sc', 'n']:
+                            phases, res = chrono(m, n, i0, j0, mode)
+                            times = ", ".join(f"{phase} {t:.3}" for phase, t in phases.items())
+                            print(f"  {mode:<2}: {sum(phases.values()):.3}, {res} ({times})")
+
+def pruning_test_script() -> None:
+    """Prints how many variables and clauses the pruning removes, for
+    square boards starting in a corner."""
+
+    for m in range(5, 11):
+        for mode in ['n', 'sc']:
+            report = pruning_report(m, m, 0, 0, mode)
+            print(f"Pruning {m}x{m} ({mode}): "
+                  f"-{report['unused_variables']}/{report['variables']} unused vars, "
+                  f"-{report['removed_clauses']}/{report['clauses']} clauses")
+
+def encoding_benchmark() -> None:
+    """Prints the time it takes to encode square boards up to 16x16, and
+    the number of clauses.
+
+    The naive mode stops at 10x10: its clauses grow as (M * N)^3.
+    """
+
+    for m in range(4, 17, 2):
+        for mode in ['n', 'sc']:
+            if mode == 'n' and m > 10:
+                continue
+            start = time()
+            solver, vars = build_knight_tour(m, m, 0, 0, mode)
+            print(f"Encode {m}x{m} ({mode}): {time() - start:.3f}s, "
+                  f"{solver.nof_clauses()} clauses")
+            solver.delete()
+
+def counting_test_script() -> None:
+    """Cross-checks the counting dynamic program against the SAT
+    enumeration, start square by start square, around 3x4."""
+
+    for m, n in [(3, 4), (4, 3), (3, 5), (3, 6), (4, 4), (4, 5), (3, 7)]:
+        counts, total = count_tours(m, n, max_cells=21)
+        sat_counts = []
+        for i0 in range(m):
+            row = []
+            for j0 in range(n):
+                solver, vars = build_knight_tour(m, n, i0, j0, 'sc')
+                row.append(count_solutions(solver, m, n, vars))
+            sat_counts.append(row)
+        print(f"Count {m}x{n}: {total} tours, "
+              f"{'matches' if counts == sat_counts else 'DIFFERS FROM'} SAT")
+
+def cardinality_comparison(boards=((5, 5), (6, 6), (5, 8), (8, 8)),
+                           encodings=CARD_ENCODINGS) -> None:
+    """Prints, for each board starting in a corner and each exactly-one
+    encoding used for both the cell and the time constraints, the number
+    of variables and clauses and the time to find one tour."""
+
+    print(f"{'board':>6} {'encoding':>12} {'vars':>8} {'clauses':>9} {'solve':>8}")
+    for m, n in boards:
+        for encoding in encodings:
+            solver, vars = build_knight_tour(m, n, 0, 0, 'sc', cell_encoding=encoding,
+                                             time_encoding=encoding)
+            start = time()
+            solver.solve()
+            print(f"{f'{m}x{n}':>6} {encoding:>12} {len(vars):>8} "
+                  f"{solver.nof_clauses():>9} {time() - start:>7.3f}s")
+            solver.delete()
+
+def sweep_test_script(output: str = "sweep.jsonl") -> None:
+    """Looks for a tour from every start square of every board up to 8x8,
+    on all the cores. Run it again to resume a killed sweep."""
+
+    records = run_sweep(grid_jobs(boards_up_to(8)), output)
+    for (m, n, mode), entry in sorted(sweep_summary(records).items()):
+        print(f"Sweep {m}x{n} ({mode}): {entry['starts']}/{m * n} starts "
+              f"with a tour, {entry['time']:.3f}s")
+
+def stitching_test_script() -> None:
+    """Prints the time it takes to stitch tours of very large boards, the
+    base tours of the blocks being found by the SAT solver first."""
+
+    for m in [50, 100, 200, 500]:
+        start = time()
+        solution = stitched_tour(m, m, m // 2, m // 3)
+        print(f"Stitch {m}x{m}: {time() - start:.3f}s")
+        if m == 50:
+            rainbow_plot(solution, "figs/manual/stitched")
+
+def budget_test_script() -> None:
+    """Gives a second to boards whose start square has no tour, unpruned so
+    that the colours do not tell it up front, and prints what is left unknown."""
+
+    for m, n, i0, j0 in [(4, 4, 0, 0), (5, 5, 0, 1), (7, 7, 0, 1)]:
+        solver, vars = build_knight_tour(m, n, i0, j0, 'sc', prune=False)
+        start = time()
+        _, res = extract_solution(solver, m, n, vars, budget=Budget(timeout=1.0))
+        print(f"Budget {m}x{n} from ({i0}, {j0}): "
+              f"{'unknown' if res is None else res} after {time() - start:.3f}s")
+        solver.delete()
+
+    # A conflict budget is shared by all the solve calls of an enumeration
+    budget = Budget(conflicts=2000)
+    solver, vars = build_knight_tour(6, 6, 0, 0, 'sc')
+    count = count_solutions(solver, 6, 6, vars, budget=budget)
+    solver.delete()
+    print(f"Budget 6x6 enumeration: {count} tours, stopped: {budget.exhausted}, "
+          f"{budget.used['conflicts']} conflicts")
+    assert budget.exhausted and budget.used['conflicts'] < 2 * budget.conflicts
+
+def verification_test_script() -> None:
+    """Enumerates the 5x5 tours from a corner in every mode and checks
+    them all at once (see check_tours)."""
+
+    for mode in ['n', 'sc', 'succ', 'log']:
+        solver, vars = build_knight_tour(5, 5, 0, 0, mode)
+        solutions, _ = extract_all_solutions(solver, 5, 5, vars)
+        solver.delete()
+        start = time()
+        check_tours(solutions, 5, 5, 0, 0)
+        print(f"Verify 5x5 ({mode}): {len(solutions)} tours in {time() - start:.4f}s")
 
 def exhaustive_plot() -> None:
     """Plots a single solution (if it exist) from every combination of M, N, i0, j0 and mode.
@@ -46,7 +163,7 @@ def exhaustive_plot() -> None:
     Saves its result in a dedicated folder under `./figs/auto/`.
     """
     M = N = range(0, 7)
-    MODE = ["n", "sc"]
+    MODE = ["n", "sc", "succ"]
 
     for m in M:
         for n in M:
@@ -54,11 +171,13 @@ def exhaustive_plot() -> None:
                 dir_path = Path(f"figs/auto/plots_{m}x{n}")
                 dir_path.mkdir(parents=True, exist_ok=True)
 
-                for i0 in range(m):
-                    for j0 in range(n):
-                        for mode in MODE:
-                            solver, vars = build_knight_tour(m, n, i0, j0, mode)
-                            solution, res = extract_solution(solver, m, n, vars)
+                for mode in MODE:
+                    # One encoding per board, the start is an assumption
+                    solver, vars = build_knight_board(m, n, mode)
+                    for i0 in range(m):
+                        for j0 in range(n):
+                            start = vars.start_assumptions(i0, j0)
+                            solution, res = extract_solution(solver, m, n, vars, start)
 
                             if res:
                                 file_path = dir_path / f"plot_{m}x{n}_{i0}-{j0}_{mode}"
@@ -91,4 +210,12 @@ if __name__ == '__main__':
 
     # Custom tests
     #timing_test_script()
+    #pruning_test_script()
+    #encoding_benchmark()
+    #counting_test_script()
+    #cardinality_comparison()
+    #sweep_test_script()
+    #stitching_test_script()
+    #budget_test_script()
+    #verification_test_script()
     #exhaustive_plot()
\ No newline at end of file
@@ -0,0 +1,104 @@
+import numpy as np
+
+def is_permutation(rows: np.ndarray) -> np.ndarray:
+    """Tells, for each row of a (K, T) array, whether it holds each of
+    0..T-1 exactly once."""
+
+    K, T = rows.shape
+    in_range = (rows >= 0) & (rows < T)
+    # Count the values of all the rows at once, each row on its own T bins
+    flat = (np.where(in_range, rows, 0) + T * np.arange(K)[:, None])[in_range]
+    counts = np.bincount(flat, minlength=K * T).reshape(K, T)
+    return in_range.all(axis=1) & (counts == 1).all(axis=1)
+
+def path_checks(paths, M: int, N: int, i0=None, j0=None, closed=False,
+                constraints=()) -> dict[str, np.ndarray]:
+    """Checks a batch of tours given as cell indices i * N + j in visiting
+    order, e.g. SolutionStore.paths().
+
+    @param paths: A (K, M * N) array.
+    @param i0: The start row, None not to check the start.
+    @param j0: The start column.
+    @param closed: Whether to check that the tours are closed.
+    @param constraints: (t, i, j) positions every tour must go through,
+        e.g. the constraints of uniqueness_constraints.
+    @return: for each check, a (K,) boolean array telling which tours pass
+        it: 'permutation' (every cell visited once), 'start', 'moves'
+        (knight moves only), 'closed' and 'constraints'.
+    """
+
+    paths = np.asarray(paths, dtype=np.int64).reshape(-1, M * N)
+    K, T = paths.shape
+    checks = {'permutation': is_permutation(paths)}
+    ones = np.ones(K, dtype=bool)
+
+    checks['start'] = ones if i0 is None or T == 0 else paths[:, 0] == i0 * N + j0
+
+    i, j = np.divmod(paths, N)
+    di, dj = np.abs(np.diff(i, axis=1)), np.abs(np.diff(j, axis=1))
+    checks['moves'] = (((di == 1) & (dj == 2)) | ((di == 2) & (dj == 1))).all(axis=1)
+
+    if closed:
+        di, dj = np.abs(i[:, -1] - i[:, 0]), np.abs(j[:, -1] - j[:, 0])
+        checks['closed'] = ((di == 1) & (dj == 2)) | ((di == 2) & (dj == 1))
+    else:
+        checks['closed'] = ones
+
+    checks['constraints'] = ones
+    if len(constraints):
+        t, ci, cj = np.asarray(constraints, dtype=np.int64).T
+        if np.any((t < 0) | (t >= T)):
+            checks['constraints'] = ~ones
+        else:
+            checks['constraints'] = (paths[:, t] == ci * N + cj).all(axis=1)
+
+    return checks
+
+def tour_checks(solutions, M: int, N: int, i0=None, j0=None, closed=False,
+                constraints=()) -> dict[str, np.ndarray]:
+    """Checks a batch of solution matrices, holding the timestep at which
+    each cell is visited, as extract_solution and extract_all_solutions
+    return them.
+
+    @param solutions: A single M x N solution, or a (K, M, N) batch of them.
+    @return: the checks of path_checks, 'permutation' telling that every
+        timestep 0..T-1 appears once.
+    """
+
+    times = np.asarray(solutions, dtype=np.int64).reshape(-1, M * N)
+    K, T = times.shape
+    permutation = is_permutation(times)
+
+    # The cell at each timestep, only meaningful for the permutations
+    paths = np.zeros_like(times)
+    valid = np.where(permutation[:, None], times, np.arange(T))
+    np.put_along_axis(paths, valid, np.arange(T), axis=1)
+
+    checks = path_checks(paths, M, N, i0, j0, closed, constraints)
+    checks = {name: passed & permutation for name, passed in checks.items()}
+    checks['permutation'] = permutation
+    return checks
+
+def verify_tours(solutions, M: int, N: int, i0=None, j0=None, closed=False,
+                 constraints=()) -> np.ndarray:
+    """Tells which solutions of a batch are knight's tours passing all the
+    checks of tour_checks, as a (K,) boolean array."""
+
+    checks = tour_checks(solutions, M, N, i0, j0, closed, constraints)
+    return np.logical_and.reduce(list(checks.values()))
+
+def check_tours(solutions, M: int, N: int, i0=None, j0=None, closed=False,
+                constraints=()):
+    """Raises a RuntimeError if any solution of a batch fails a check of
+    tour_checks, e.g. as a post-check of a solve."""
+
+    checks = tour_checks(solutions, M, N, i0, j0, closed, constraints)
+    # The other checks of a tour that is no permutation tell nothing more
+    permutation = checks['permutation']
+    failed = {name: np.flatnonzero(~passed & (permutation | (name == 'permutation')))
+              for name, passed in checks.items()}
+    failed = {name: ks for name, ks in failed.items() if len(ks)}
+    if failed:
+        details = "; ".join(f"{name} fails for {len(ks)} tours, e.g. #{ks[0]}"
+                            for name, ks in failed.items())
+        raise RuntimeError(f"Invalid {M}x{N} tours: {details}")
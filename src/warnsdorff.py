@@ -0,0 +1,241 @@
+import numpy as np
+from counting import knight_graph
+from helpers import SuccessorVars
+
+def warnsdorff_path(M: int, N: int, i0: int, j0: int,
+                    max_steps: int | None = None) -> list[int]:
+    """Builds a knight path from (i0, j0) with Warnsdorff's rule, and
+    backtracking when it gets stuck.
+
+    The knight goes to the free neighbour with the fewest free neighbours
+    itself, ties going to the cell farthest from the centre of the board,
+    which keeps the rule from getting stuck on most boards. When the path
+    cannot be extended, the last move is undone and the next candidate is
+    tried.
+
+    @param M: The number of rows in the chessboard.
+    @param N: The number of columns in the chessboard.
+    @param i0: The start row.
+    @param j0: The start column.
+    @param max_steps: The number of moves, played or undone, after which
+        the search gives up, by default 10 * M * N.
+    @return: the cell indices i * N + j of the tour, or of the longest path
+        found if the search gave up.
+    """
+
+    T = M * N
+    if max_steps is None:
+        max_steps = 10 * T
+    adj = knight_graph(M, N)
+    i, j = np.divmod(np.arange(T), N)
+    centre = (2 * i - (M - 1)) ** 2 + (2 * j - (N - 1)) ** 2
+
+    free = np.ones(T, dtype=bool)
+    degree = np.array([len(cells) for cells in adj])  # free neighbours
+
+    def visit(c):
+        free[c] = False
+        for d in adj[c]:
+            degree[d] -= 1
+
+    def candidates(c):
+        cells = [d for d in adj[c] if free[d]]
+        # Popped from the end: the best candidate goes last
+        return sorted(cells, key=lambda d: (degree[d], -centre[d]), reverse=True)
+
+    start = i0 * N + j0
+    path = [start]
+    visit(start)
+    stack = [candidates(start)]
+    best = []  # the longest path, saved before backtracking from it
+
+    for _ in range(max_steps):
+        if len(path) == T:
+            return path
+        if stack[-1]:
+            c = stack[-1].pop()
+            path.append(c)
+            visit(c)
+            stack.append(candidates(c))
+        elif len(path) > 1:
+            if len(path) > len(best):
+                best = list(path)
+            c = path.pop()
+            stack.pop()
+            free[c] = True
+            for d in adj[c]:
+                degree[d] += 1
+        else:
+            break
+
+    return path if len(path) >= len(best) else best
+
+def is_knight_tour(path, M: int, N: int, i0: int, j0: int) -> bool:
+    """Checks that path, as cell indices i * N + j, is a knight's tour from
+    (i0, j0): it visits every cell once, with knight moves."""
+
+    path = np.asarray(path)
+    if len(path) != M * N or len(path) == 0 or path[0] != i0 * N + j0:
+        return False
+    if len(np.unique(path)) != M * N:
+        return False
+    i, j = np.divmod(path, N)
+    di, dj = np.abs(np.diff(i)), np.abs(np.diff(j))
+    return bool(np.all(((di == 1) & (dj == 2)) | ((di == 2) & (dj == 1))))
+
+def path_to_solution(path, M: int, N: int) -> list[list[int]]:
+    """The solution matrix of a path of cell indices: the timestep at which
+    each cell is visited, -1 if never."""
+
+    solution = np.full(M * N, -1)
+    solution[np.asarray(path, dtype=np.int64)] = np.arange(len(path))
+    return solution.reshape(M, N).tolist()
+
+def path_literals(path, M: int, N: int, var) -> list[int]:
+    """The literals making the solver play the moves of a path of cell
+    indices, in the time-indexed or the successor encoding."""
+
+    if isinstance(var, SuccessorVars):
+        return [var[('next', *divmod(int(c), N), *divmod(int(d), N))]
+                for c, d in zip(path, path[1:])]
+    return var.path_ids(path).tolist()
+
+def tour_model(path, var) -> list[int]:
+    """The model of the position variables of a VarLayout in which the
+    knight follows path, every other position being false: T^2 literals,
+    too many to build on large boards unless asked for."""
+
+    model = -np.arange(1, var.T * var.T + 1)
+    ids = var.path_ids(path)
+    model[ids - 1] = ids
+    return model.tolist()
+
+def warnsdorff_hint(solver, M: int, N: int, var, assumptions=[]) -> bool:
+    """Tries a Warnsdorff path from the start square of var on the solver.
+
+    A complete tour is checked against every constraint of the solver by
+    solving under its moves as assumptions, which unit propagation settles
+    at once. Otherwise, or if it is rejected, the moves of the path become
+    the preferred phases of the solver.
+
+    @return: whether the solver accepted the tour, whose model is then
+        available through solver.get_model().
+    """
+
+    if var.start is None:
+        return False
+    path = warnsdorff_path(M, N, *var.start)
+    literals = path_literals(path, M, N, var)
+    if is_knight_tour(path, M, N, *var.start) and \
+            solver.solve(assumptions=assumptions + literals):
+        return True
+    solver.set_phases(literals)
+    return False
+
+class TourSolver:
+    """Stands in for a solver whose formula has a tour known beforehand.
+
+    The tour is the first model, and is returned as long as the
+    assumptions agree with it. Only its path is kept: extract_solution
+    reads the solution from it, and the model is built by get_model on
+    demand. The formula is only encoded into a real solver, by calling
+    build, when anything else is asked: adding a clause, solving under
+    other assumptions, or any other solver method but the budgets and
+    interrupts, which are kept until then.
+    """
+
+    def __init__(self, path, var, build):
+        """@param build: A function returning the solver with the formula
+            and its variables, whose layout replaces var's."""
+
+        self.var = var
+        self.path = path
+        self.model = None  # built by get_model
+        self.true = set(var.path_ids(path).tolist())
+        self.build = build
+        self.solver = None
+        self.answered = False
+        self.budgets = {}  # set before encoding, see conf_budget
+        self.interrupted = False
+
+    def encoded(self):
+        """The real solver, with the tour as preferred phases."""
+
+        if self.solver is None:
+            self.solver, var = self.build()
+            self.var.aux, self.var.next_id = var.aux, var.next_id
+            self.solver.set_phases(sorted(self.true))
+            for name, budget in self.budgets.items():
+                getattr(self.solver, name)(budget)
+            if self.interrupted:
+                self.solver.interrupt()
+        return self.solver
+
+    def agrees(self, assumptions) -> bool:
+        """Tells whether the tour satisfies the assumptions, before encoding."""
+
+        positions = self.var.T * self.var.T
+        self.answered = self.solver is None and all(
+            lit in self.true or (0 < -lit <= positions and -lit not in self.true)
+            for lit in assumptions)
+        return self.answered
+
+    def solve(self, assumptions=[]):
+        if self.agrees(assumptions):
+            return True
+        return self.encoded().solve(assumptions=assumptions)
+
+    def solve_limited(self, assumptions=[], expect_interrupt=False):
+        if self.agrees(assumptions):
+            return True
+        return self.encoded().solve_limited(assumptions=assumptions,
+                                            expect_interrupt=expect_interrupt)
+
+    def conf_budget(self, budget):
+        self.budget('conf_budget', budget)
+
+    def prop_budget(self, budget):
+        self.budget('prop_budget', budget)
+
+    def budget(self, name, budget):
+        """Sets a budget of the real solver, once it is encoded."""
+
+        if self.solver is None:
+            self.budgets[name] = budget
+        else:
+            getattr(self.solver, name)(budget)
+
+    def accum_stats(self):
+        return {} if self.solver is None else self.solver.accum_stats()
+
+    def interrupt(self):
+        self.interrupted = True
+        if self.solver is not None:
+            self.solver.interrupt()
+
+    def clear_interrupt(self):
+        self.interrupted = False
+        if self.solver is not None:
+            self.solver.clear_interrupt()
+
+    def get_model(self):
+        if self.answered:
+            if self.model is None:
+                self.model = tour_model(self.path, self.var)
+            return self.model
+        return self.encoded().get_model()
+
+    def add_clause(self, clause):
+        self.answered = False
+        self.encoded().add_clause(clause)
+
+    def append_formula(self, clauses):
+        self.answered = False
+        self.encoded().append_formula(clauses)
+
+    def delete(self):
+        if self.solver is not None:
+            self.solver.delete()
+
+    def __getattr__(self, name):
+        return getattr(self.encoded(), name)